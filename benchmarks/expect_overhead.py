@@ -0,0 +1,57 @@
+"""Measure the per-assertion overhead of passing `expect` calls.
+
+Run with `python benchmarks/expect_overhead.py` from the repository root.
+"""
+
+from os.path import dirname, abspath
+import sys
+import timeit
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from soaper import TestSuite, test, expect
+
+
+NUMBER = 1_000_000
+
+
+class OverheadSuite(TestSuite):
+	"""Passing assertions only"""
+
+	@test
+	def to_equal():
+		for i in range(NUMBER):
+			expect(i).to_equal(i)
+
+	@test
+	def truthy():
+		for i in range(NUMBER):
+			expect(True).truthy()
+
+	@test
+	def to_raise():
+		for i in range(NUMBER // 10):
+			with expect.to_raise(KeyError):
+				raise KeyError
+
+
+def baseline():
+	for i in range(NUMBER):
+		i == i
+
+
+def main():
+	base = min(timeit.repeat(baseline, number=1, repeat=5)) / NUMBER
+	print(f"{'loop + compare':<16}{base * 1e9:8.1f} ns")
+
+	for func, count in [
+		(OverheadSuite.to_equal, NUMBER),
+		(OverheadSuite.truthy, NUMBER),
+		(OverheadSuite.to_raise, NUMBER // 10),
+	]:
+		per_call = min(timeit.repeat(func, number=1, repeat=5)) / count
+		print(f"{func.__name__:<16}{per_call * 1e9:8.1f} ns")
+
+
+if __name__ == "__main__":
+	main()
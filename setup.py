@@ -13,5 +13,6 @@ setup(
 	author='BlueishSapphire',
 	author_email='blueishsapphire1@gmail.com',
 	packages=['soaper'],
-	install_requires=[]
+	install_requires=[],
+	extras_require={'numpy': ['numpy']},
 )
\ No newline at end of file
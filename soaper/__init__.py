@@ -1,11 +1,18 @@
 from .soaper import TestSuite
-from .decorator import test
+from .decorator import test, fixture
 from .expect import expect, call_with
+from .reporter import Reporter, ConsoleReporter, MultiReporter, JUnitReporter, JsonLinesReporter
 
 
 __all__ = [
 	"TestSuite",
 	"test",
+	"fixture",
 	"expect",
-	"call_with"
+	"call_with",
+	"Reporter",
+	"ConsoleReporter",
+	"MultiReporter",
+	"JUnitReporter",
+	"JsonLinesReporter"
 ]
\ No newline at end of file
@@ -1,9 +1,100 @@
 from . import *
+from .discovery import discover
+from . import benchmark
+from .distributed import default_address
 
 
-def main() -> None:
-	pass
+from argparse import ArgumentParser, BooleanOptionalAction
+import sys
+
+
+def _parse_args(argv: list[str] = None):
+	parser = ArgumentParser(
+		prog="python -m soaper",
+		description="Find and run every soaper test suite under the given paths.",
+	)
+	parser.add_argument("paths", nargs="*", default=["."], help="test files or directories to search (default: .)")
+	parser.add_argument("-j", "--workers", type=int, default=0, help="run tests on this many processes")
+	parser.add_argument("-t", "--threads", type=int, default=0, help="run each suite's tests on this many threads")
+	parser.add_argument("-q", "--quiet", action="store_true", help="only show failures and the summary")
+	parser.add_argument("--color", action=BooleanOptionalAction, default=None, help="force colors on or off (default: only on a terminal)")
+	parser.add_argument("--junit-xml", metavar="PATH", help="also write results to a JUnit XML file")
+	parser.add_argument("--jsonl", metavar="PATH", help="also write results to a JSON lines file")
+	parser.add_argument("--ff", "--failed-first", dest="failed_first", action="store_true", help="run the tests that failed last time first")
+	parser.add_argument("--lf", "--last-failed", dest="last_failed", action="store_true", help="only run the tests that failed last time")
+	parser.add_argument("-x", "--fail-fast", action="store_true", help="stop starting tests after the first failure")
+	parser.add_argument("--max-failures", metavar="N", type=int, default=0, help="stop starting tests after N failures")
+	parser.add_argument("--incremental", action="store_true", help="skip tests that passed last time and haven't changed since")
+	parser.add_argument("--trace-memory", action="store_true", help="measure how much memory each test uses and keeps")
+	parser.add_argument("--update-benchmarks", action="store_true", help="save this run's benchmark results as the new baselines")
+	parser.add_argument("--shard", type=int, help="only run this shard of the tests, numbered from 0 (needs --shards)")
+	parser.add_argument("--shards", type=int, help="how many shards the tests are split into")
+	parser.add_argument("--durations", metavar="PATH", nargs="+", action="extend", help="balance shards by the test durations in these files")
+	parser.add_argument("--serve", metavar="HOST:PORT", nargs="?", const=default_address, help=f"hand out the tests to workers that connect to this address (default: {default_address})")
+	parser.add_argument("--worker", metavar="HOST:PORT", help="run the tests handed out by the coordinator at this address")
+	parser.add_argument("--watch", action="store_true", help="keep running, and re-run the affected suites whenever a file changes")
+	parser.add_argument("--no-cache", action="store_true", help="import every test file, ignoring the discovery cache")
+	return parser.parse_args(argv)
+
+
+def _configure(args, suites: list[type]):
+	for suite in suites:
+		if args.incremental:
+			suite.config.incremental = True
+		if args.trace_memory:
+			suite.config.trace_memory = True
+
+
+def _run_suites(args, suites: list[type]) -> int:
+	_configure(args, suites)
+
+	reporters = [ConsoleReporter(color=args.color, quiet=args.quiet)]
+	if args.junit_xml:
+		reporters.append(JUnitReporter(args.junit_xml))
+	if args.jsonl:
+		reporters.append(JsonLinesReporter(args.jsonl))
+	reporter = MultiReporter(*reporters)
+
+	num_fails = TestSuite.run_all(
+		workers=args.workers,
+		threads=args.threads,
+		suites=suites,
+		reporter=reporter,
+		order="failed-first" if args.failed_first else None,
+		only="last-failed" if args.last_failed else None,
+		shard=args.shard,
+		total=args.shards,
+		durations=args.durations,
+		serve=args.serve,
+		fail_fast=args.fail_fast,
+		max_failures=args.max_failures,
+	)
+	return num_fails
+
+
+def main(argv: list[str] = None) -> int:
+	args = _parse_args(argv)
+	benchmark.update_baselines = args.update_benchmarks
+
+	# the watcher needs every test file imported so it knows which suites each file affects
+	suites = discover(args.paths, use_cache=not (args.no_cache or args.watch))
+	# suites with `autorun_tests` already ran when they were imported
+	suites = [suite for suite in suites if not suite.is_done]
+
+	if args.worker:
+		from .distributed import run_worker
+		_configure(args, suites)
+		return run_worker(args.worker)
+
+	num_fails = _run_suites(args, suites)
+
+	if args.watch:
+		from .watch import watch
+		watch(args.paths, lambda suites: _run_suites(args, suites))
+		return 0
+
+	return 1 if num_fails else 0
 
 
 if __name__ == "__main__":
-	main()
+	sys.exit(main())
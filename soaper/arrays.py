@@ -0,0 +1,147 @@
+from array import array
+from dataclasses import dataclass, field
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+
+_array_types = (array,) if numpy is None else (array, numpy.ndarray)
+
+
+@dataclass
+class mismatch:
+	"""Where two arrays differ, summarized so it stays small however large the arrays are.
+	"""
+	count: int
+	size: int
+	# only set when the shapes differ, in which case nothing else is compared
+	shapes: tuple = None
+	# the first few differing elements, as (index, a, b)
+	first: list = field(default_factory=list)
+	max_abs_diff: float = None
+	mean_abs_diff: float = None
+
+
+def is_array(value: any) -> bool:
+	return isinstance(value, _array_types)
+
+
+def _numpy_mismatch(a, b, max_items: int, tolerance: tuple[float, float] = None) -> mismatch:
+	a = numpy.asarray(a)
+	b = numpy.asarray(b)
+
+	if a.shape != b.shape:
+		return mismatch(max(a.size, b.size), max(a.size, b.size), (a.shape, b.shape))
+
+	try:
+		if tolerance is None:
+			differs = numpy.asarray(a != b)
+		else:
+			atol, rtol = tolerance
+			differs = ~numpy.isclose(b, a, rtol=rtol, atol=atol)
+	except TypeError:
+		differs = None
+
+	# arrays that can't be compared element by element differ everywhere
+	if differs is None or differs.shape != a.shape:
+		differs = numpy.ones(a.shape, dtype=bool)
+
+	count = int(numpy.count_nonzero(differs))
+	if count == 0:
+		return None
+
+	first = []
+	for i in numpy.flatnonzero(differs)[:max_items]:
+		index = int(i) if a.ndim == 1 else tuple(map(int, numpy.unravel_index(i, a.shape)))
+		first.append((index, a.flat[i].item(), b.flat[i].item()))
+
+	result = mismatch(count, a.size, first=first)
+
+	if numpy.issubdtype(a.dtype, numpy.number) and numpy.issubdtype(b.dtype, numpy.number):
+		# widen first so unsigned and small integer types don't wrap around
+		dtype = numpy.result_type(a.dtype, b.dtype, numpy.float64)
+		with numpy.errstate(invalid="ignore", over="ignore"):
+			diff = numpy.abs(a[differs].astype(dtype) - b[differs].astype(dtype))
+		result.max_abs_diff = float(diff.max())
+		result.mean_abs_diff = float(diff.mean())
+
+	return result
+
+
+def _python_mismatch(a, b, max_items: int, tolerance: tuple[float, float] = None) -> mismatch:
+	if len(a) != len(b):
+		return mismatch(max(len(a), len(b)), max(len(a), len(b)), ((len(a),), (len(b),)))
+
+	count = 0
+	first = []
+	max_abs_diff = 0.0
+	sum_abs_diff = 0.0
+	numeric = True
+
+	for i, (x, y) in enumerate(zip(a, b)):
+		if tolerance is None:
+			differs = x != y
+		else:
+			differs = not abs(y - x) <= tolerance[0] + tolerance[1] * abs(x)
+
+		if not differs:
+			continue
+
+		count += 1
+		if len(first) < max_items:
+			first.append((i, x, y))
+
+		if numeric:
+			try:
+				diff = abs(x - y)
+				max_abs_diff = max(max_abs_diff, diff)
+				sum_abs_diff += diff
+			except TypeError:
+				numeric = False
+
+	if count == 0:
+		return None
+
+	result = mismatch(count, len(a), first=first)
+	if numeric:
+		result.max_abs_diff = float(max_abs_diff)
+		result.mean_abs_diff = sum_abs_diff / count
+	return result
+
+
+def find_mismatch(a, b, max_items: int = 10, tolerance: tuple[float, float] = None) -> mismatch:
+	"""Compare two arrays element by element, and return None if they match.
+
+	`tolerance` is `(atol, rtol)` to compare with `close_to`'s rules instead of exact equality.
+	This uses numpy when it's installed, and a plain loop otherwise.
+	"""
+	if numpy is not None:
+		return _numpy_mismatch(a, b, max_items, tolerance)
+	return _python_mismatch(a, b, max_items, tolerance)
+
+
+def describe(m: mismatch, plus_color: str, minus_color: str) -> str:
+	"""Describe a mismatch for a failure message.
+	"""
+	if m.shapes is not None:
+		return (
+			"shapes differ\n\n"
+			f"{plus_color}+ {m.shapes[0]}\x1b[m\n"
+			f"{minus_color}- {m.shapes[1]}\x1b[m"
+		)
+
+	lines = [f"{m.count} of {m.size} elements differ ({100 * m.count / m.size:.3g}%)"]
+	if m.max_abs_diff is not None:
+		lines.append(f"max difference: {m.max_abs_diff:g}, mean difference: {m.mean_abs_diff:g}")
+
+	lines.append("")
+	for index, a, b in m.first:
+		index = ", ".join(map(str, index)) if isinstance(index, tuple) else index
+		lines.append(f"at [{index}]: {plus_color}+ {a!r}\x1b[m {minus_color}- {b!r}\x1b[m")
+
+	if m.count > len(m.first):
+		lines.append(f"...and {m.count - len(m.first)} more")
+
+	return "\n".join(lines)
@@ -0,0 +1,119 @@
+from .context import context
+from .expect import TestFailException
+from .soaper import _test_key
+from . import cache
+
+
+from dataclasses import dataclass
+from math import ceil
+from statistics import median, stdev
+from time import perf_counter_ns
+
+
+# set to replace the saved baselines with this run's results
+update_baselines = False
+_baselines = None
+
+
+@dataclass
+class BenchmarkStats:
+	"""Timings of a single benchmark, per call, in nanoseconds.
+	"""
+
+	loops: int
+	samples: int
+	min_ns: float
+	median_ns: float
+	p95_ns: float
+	stddev_ns: float
+	baseline_ns: float = None
+
+	@property
+	def ops_per_sec(self) -> float:
+		return 1e9 / self.median_ns if self.median_ns > 0 else float("inf")
+
+	@property
+	def regression(self) -> float:
+		"""How much slower the median is than the baseline, as a fraction (0.1 is 10% slower).
+		"""
+		if not self.baseline_ns:
+			return 0.0
+		return self.median_ns / self.baseline_ns - 1
+
+
+def _get_baselines() -> dict:
+	global _baselines
+	if _baselines is None:
+		_baselines = cache.load("benchmarks")
+	return _baselines
+
+
+def _time(call: callable, loops: int) -> int:
+	start = perf_counter_ns()
+	for _ in range(loops):
+		call()
+	return perf_counter_ns() - start
+
+
+def _calibrate(call: callable, sample_time_ns: int) -> int:
+	"""Find how many calls it takes for a single sample to last at least `sample_time_ns`.
+	"""
+	loops = 1
+	while True:
+		elapsed = _time(call, loops)
+		if elapsed >= sample_time_ns:
+			return loops
+		if elapsed * 10 >= sample_time_ns:
+			return ceil(loops * sample_time_ns / max(elapsed, 1))
+		loops *= 10
+
+
+def measure(cls: any, test_name: str, call: callable) -> BenchmarkStats:
+	"""Time `call` with the suite's benchmark settings, and compare it to the saved baseline.
+	"""
+	cfg = cls.config
+	loops = _calibrate(call, int(cfg.benchmark_sample_time * 1e9))
+
+	for _ in range(cfg.benchmark_warmup):
+		_time(call, loops)
+
+	times = sorted(_time(call, loops) / loops for _ in range(max(cfg.benchmark_samples, 2)))
+
+	return BenchmarkStats(
+		loops=loops,
+		samples=len(times),
+		min_ns=times[0],
+		median_ns=median(times),
+		p95_ns=times[min(len(times) - 1, ceil(len(times) * 0.95) - 1)],
+		stddev_ns=stdev(times),
+		baseline_ns=_get_baselines().get(_test_key(cls, test_name)),
+	)
+
+
+def check_regression(cls: any, func: callable, stats: BenchmarkStats):
+	"""Fail the test if its median is too far past the baseline.
+	"""
+	limit = cls.config.benchmark_max_regression
+	if update_baselines or stats.regression <= limit:
+		return
+
+	raise TestFailException(
+		context.from_func(cls, func),
+		f"median regressed by \x1b[22m{cls.color.received}{stats.regression:.1%}\x1b[m\n"
+		f"allowed regression: \x1b[22m{cls.color.expected}{limit:.1%}\x1b[m",
+	)
+
+
+def record(cls: any, test_name: str, stats: BenchmarkStats, passed: bool):
+	"""Save the result as the new baseline, if there wasn't one or baselines are being updated.
+	"""
+	baselines = _get_baselines()
+	key = _test_key(cls, test_name)
+
+	if key in baselines and not update_baselines:
+		return
+	if not passed and not update_baselines:
+		return
+
+	baselines[key] = stats.median_ns
+	cache.save("benchmarks", baselines)
@@ -0,0 +1,31 @@
+from os.path import join
+import json
+import os
+
+
+# where soaper keeps the state it carries between runs
+cache_dir = ".soaper_cache"
+
+
+def load(name: str) -> dict:
+	"""Load a cache file, returning an empty dict if it is missing or unreadable.
+	"""
+	try:
+		with open(join(cache_dir, name + ".json"), "r") as f:
+			data = json.load(f)
+	except (OSError, ValueError):
+		return {}
+
+	return data if isinstance(data, dict) else {}
+
+
+def save(name: str, data: dict):
+	"""Write a cache file, replacing it atomically so a crashed run can't leave it half written.
+	"""
+	os.makedirs(cache_dir, exist_ok=True)
+	path = join(cache_dir, name + ".json")
+	tmp_path = f"{path}.{os.getpid()}.tmp"
+
+	with open(tmp_path, "w") as f:
+		json.dump(data, f)
+	os.replace(tmp_path, path)
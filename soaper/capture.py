@@ -0,0 +1,54 @@
+from contextvars import ContextVar
+import sys
+
+
+_stdout = ContextVar("soaper_stdout", default=None)
+_stdin = ContextVar("soaper_stdin", default=None)
+
+
+class _StreamProxy:
+	"""Stands in for `sys.stdout`/`sys.stdin` and forwards to the stream set for the current context.
+
+	Anything that has not redirected the stream in its context uses the stream that was replaced.
+	"""
+
+	def __init__(self, var: ContextVar, fallback):
+		self._var = var
+		self._fallback = fallback
+
+	def _target(self):
+		stream = self._var.get()
+		return self._fallback if stream is None else stream
+
+	def __getattr__(self, name: str):
+		return getattr(self._target(), name)
+
+	def __iter__(self):
+		return iter(self._target())
+
+
+def _install():
+	"""Put the proxies in place, unless something has already done so.
+	"""
+	if not isinstance(sys.stdout, _StreamProxy):
+		sys.stdout = _StreamProxy(_stdout, sys.stdout)
+	if not isinstance(sys.stdin, _StreamProxy):
+		sys.stdin = _StreamProxy(_stdin, sys.stdin)
+
+
+class redirect:
+	"""Redirect stdout or stdin to `stream` for the current thread or task only.
+	"""
+
+	def __init__(self, var: ContextVar, stream):
+		self.var = var
+		self.stream = stream
+		self.token = None
+
+	def __enter__(self):
+		_install()
+		self.token = self.var.set(self.stream)
+		return self.stream
+
+	def __exit__(self, err_type, err_value, traceback):
+		self.var.reset(self.token)
@@ -1,5 +1,45 @@
+from collections import OrderedDict
 from dataclasses import dataclass
 from os.path import basename, relpath
+from types import SimpleNamespace
+import linecache
+import os
+
+
+def _display_path(file_name: str) -> str:
+	"""Get a path relative to the working directory, or the full path if it's outside of it.
+	"""
+	path = relpath(file_name)
+	return file_name if path.startswith("..") else path
+
+
+# file name -> (mtime, size) of the sources currently held in `linecache`
+_source_cache = OrderedDict()
+_max_source_bytes = 16 * 1024 * 1024
+
+
+def _source_lines(file_name: str) -> list[str]:
+	"""Get the lines of a source file through `linecache`, evicting the least recently used files.
+	"""
+	try:
+		stat = os.stat(file_name)
+	except OSError:
+		return linecache.getlines(file_name)
+
+	key = (stat.st_mtime_ns, stat.st_size)
+	if _source_cache.get(file_name) != key:
+		# drops the cached lines if the file changed since they were read
+		linecache.checkcache(file_name)
+		_source_cache[file_name] = key
+	_source_cache.move_to_end(file_name)
+
+	total = sum(size for _, size in _source_cache.values())
+	while total > _max_source_bytes and len(_source_cache) > 1:
+		old_name, (_, old_size) = _source_cache.popitem(last=False)
+		linecache.cache.pop(old_name, None)
+		total -= old_size
+
+	return linecache.getlines(file_name)
 
 
 def _highlight_section(
@@ -13,6 +53,9 @@ def _highlight_section(
 	end_highlight = "\x1b[39m"
 
 	if start_line == end_line:
+		if not 0 <= start_line < len(lines):
+			return
+
 		lines[start_line] = (
 			end_highlight
 			+ lines[start_line][:start_col]
@@ -22,7 +65,7 @@ def _highlight_section(
 			+ lines[start_line][end_col:]
 		)
 	else:
-		for i in range(len(lines)):
+		for i in range(max(start_line, 0), min(end_line + 1, len(lines))):
 			if i == start_line:
 				lines[i] = (
 					end_highlight
@@ -39,7 +82,7 @@ def _highlight_section(
 					+ lines[i][end_col:]
 					+ end_highlight
 				)
-			elif i > start_line and i < end_line:
+			else:
 				lines[i] = start_highlight + lines[i] + end_highlight
 
 
@@ -56,6 +99,21 @@ class context:
 		self._err_end_row = underline[1] if underline else None
 		self._err_end_col = underline[3] if underline else None
 
+	def __getstate__(self):
+		"""Replace the function with a plain snapshot of it, so the context can be sent between processes.
+		"""
+		state = self.__dict__.copy()
+		state["parent"] = None
+		state["func"] = SimpleNamespace(
+			__name__=self.func_name,
+			__doc__=self.docstring,
+			__code__=SimpleNamespace(
+				co_filename=self.file_name,
+				co_firstlineno=self.first_line_num,
+			),
+		)
+		return state
+
 	# initializers
 
 	@classmethod
@@ -100,30 +158,20 @@ class context:
 		return relpath(self.file_name)
 
 	@property
-	def lines(self) -> str:
-		first_line_num = self.first_line_num
+	def lines(self) -> list[str]:
 		last_line_num = self.line_num
+		# only the last 10 lines of the function, up to the failing line, are shown
+		start = max(self.first_line_num, last_line_num - 9)
 
-		with open(self.file_name, "r") as f:
-			lines = [l.rstrip() for l in f.readlines()]
+		lines = [l.rstrip() for l in _source_lines(self.file_name)[start:last_line_num + 1]]
 
 		if self._err_start_row is not None:
 			_highlight_section(
 				lines,
-				self._err_start_row - 1,
+				self._err_start_row - 1 - start,
 				self._err_start_col,
-				self._err_end_row - 1,
+				self._err_end_row - 1 - start,
 				self._err_end_col,
 			)
 
-		lines = lines[first_line_num:last_line_num + 1]
-		lines = list(map(str.rstrip, lines))
-
-		if len(lines) > 10:
-			lines = lines[-10:]
-
-		return lines
-
-
-
-
+		return list(map(str.rstrip, lines))
@@ -1,10 +1,31 @@
+from functools import partial
+from inspect import iscoroutinefunction
+
+
 class TestDecorator:
 	TEST = "_test"
 	FAILING = "_failing"
 	SKIP = "_skip"
+	ASYNC = "_async"
+	BENCHMARK = "_benchmark"
+	TIMEOUT = "_timeout"
+	MAX_MEMORY = "_max_memory"
+	MAX_RETAINED = "_max_retained"
+
+	def __call__(self, func = None, *, timeout: float = None, max_memory: int = None, max_retained: int = None):
+		# used as `@test(timeout=...)`
+		if func is None:
+			return partial(self, timeout=timeout, max_memory=max_memory, max_retained=max_retained)
 
-	def __call__(self, func):
 		setattr(func, self.TEST, True)
+		if timeout is not None:
+			setattr(func, self.TIMEOUT, float(timeout))
+		if max_memory is not None:
+			setattr(func, self.MAX_MEMORY, int(max_memory))
+		if max_retained is not None:
+			setattr(func, self.MAX_RETAINED, int(max_retained))
+		if iscoroutinefunction(func):
+			setattr(func, self.ASYNC, True)
 		return func
 
 	def failing(self, func):
@@ -15,5 +36,28 @@ class TestDecorator:
 		setattr(func, self.SKIP, True)
 		return self(func)
 
+	def benchmark(self, func):
+		setattr(func, self.BENCHMARK, True)
+		return self(func)
+
+
+test = TestDecorator()
+
+
+class FixtureDecorator:
+	FIXTURE = "_fixture"
+
+	def __call__(self, func):
+		setattr(func, self.FIXTURE, "test")
+		return func
+
+	def suite(self, func):
+		setattr(func, self.FIXTURE, "suite")
+		return func
+
+	def session(self, func):
+		setattr(func, self.FIXTURE, "session")
+		return func
+
 
-test = TestDecorator()
\ No newline at end of file
+fixture = FixtureDecorator()
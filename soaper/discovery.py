@@ -0,0 +1,107 @@
+from .soaper import TestSuite
+from . import cache
+
+
+from fnmatch import fnmatch
+from importlib import import_module
+from os.path import abspath, basename, dirname, isfile, join, splitext
+import os
+import sys
+
+
+test_file_patterns = ["test_*.py", "*_test.py", "tests.py"]
+_skipped_dirs = {"__pycache__", "node_modules", "venv", cache.cache_dir}
+
+
+def _is_test_file(path: str) -> bool:
+	name = basename(path)
+	return any(fnmatch(name, pattern) for pattern in test_file_patterns)
+
+
+def find_test_files(paths: list[str]) -> list[str]:
+	"""Find every test file in the given files and directories, in a stable order.
+
+	Files that are named explicitly are always included.
+	"""
+	found = []
+
+	for path in paths:
+		if isfile(path):
+			found.append(abspath(path))
+			continue
+
+		for root, dirs, files in os.walk(path):
+			dirs[:] = sorted(d for d in dirs if d not in _skipped_dirs and not d.startswith("."))
+			found.extend(abspath(join(root, f)) for f in sorted(files) if _is_test_file(f))
+
+	return found
+
+
+def _module_name(path: str) -> tuple[str, str]:
+	"""Get the dotted module name of a file, and the directory it must be imported from.
+
+	Parent directories with an `__init__.py` are treated as packages.
+	"""
+	root = dirname(path)
+	parts = [splitext(basename(path))[0]]
+
+	while isfile(join(root, "__init__.py")):
+		parts.insert(0, basename(root))
+		root = dirname(root)
+
+	return ".".join(parts), root
+
+
+def import_test_file(path: str) -> list[type]:
+	"""Import a test file, and return the suites it defined.
+
+	Importing the module registers its suites through `TestSuite.__init_subclass__`.
+	"""
+	name, root = _module_name(path)
+	if root not in sys.path:
+		sys.path.insert(0, root)
+
+	module = import_module(name)
+	# test files with the same name in directories that aren't packages are both imported as `name`
+	module_path = getattr(module, "__file__", None)
+	if module_path is None or abspath(module_path) != abspath(path):
+		raise Exception(
+			f"Can't import \"{path}\" as module \"{name}\", since \"{module_path}\" is already imported under that name. "
+			"Rename one of them, or add an __init__.py to their directories to make them packages"
+		)
+	return [suite for suite in TestSuite.suites if suite.__module__ == name]
+
+
+def discover(paths: list[str], use_cache: bool = True) -> list[type]:
+	"""Import every test file under the given paths, and return the suites they define.
+
+	Files that had no suites the last time they were imported are skipped until they change.
+	"""
+	known = cache.load("discovery") if use_cache else {}
+	# keep what we know about files outside these paths, as long as they still exist
+	found = {path: entry for path, entry in known.items() if isfile(path)}
+	suites = []
+
+	for path in find_test_files(paths):
+		mtime = os.stat(path).st_mtime_ns
+		entry = known.get(path)
+
+		if entry and entry["mtime"] == mtime and not entry["suites"]:
+			found[path] = entry
+			continue
+
+		file_suites = import_test_file(path)
+		suites.extend(file_suites)
+		found[path] = {
+			"mtime": mtime,
+			"suites": {
+				suite.__qualname__: [test.name for test in suite.tests]
+				for suite in file_suites
+			},
+		}
+
+	if use_cache:
+		cache.save("discovery", found)
+
+	return suites
+
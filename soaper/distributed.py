@@ -0,0 +1,322 @@
+from .context import context
+from .soaper import TestOutcome, TestResult, _failure_limit, _run_test
+from .parallel import _find_suite, plan_jobs, report_plans
+
+
+from collections import deque
+from dataclasses import asdict
+import json
+import queue
+import socket
+import sys
+import threading
+import time
+
+
+# where `--serve` listens when no address is given
+default_address = "127.0.0.1:7357"
+# how long a worker keeps trying to reach a coordinator that isn't up yet
+_connect_timeout = 10.0
+# the most tests handed to a worker at once, so a slow worker can't sit on the rest of the run
+_max_batch = 64
+
+
+def parse_address(address: str) -> tuple[str, int]:
+	host, sep, port = address.rpartition(":")
+	if not sep or not port.isdigit():
+		raise Exception(f"Invalid address \"{address}\", expected host:port")
+	return host or "127.0.0.1", int(port)
+
+
+# messages are one JSON object per line, so nothing a peer sends is ever unpickled
+
+def _send(f, message: dict):
+	f.write(json.dumps(message) + "\n")
+	f.flush()
+
+
+def _receive(f) -> dict:
+	line = f.readline()
+	if not line:
+		raise EOFError("connection closed")
+	return json.loads(line)
+
+
+def _open(sock: socket.socket, mode: str):
+	# messages are small and often waited on, so they can't wait to be batched
+	sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+	# each side reads and writes from different threads, so reading and writing get their own files
+	return sock.makefile(mode, encoding="utf-8", newline="\n")
+
+
+def outcome_record(outcome: TestOutcome) -> dict:
+	"""Get the fields of an outcome as plain JSON values, which `outcome_from_record` turns back into an outcome.
+	"""
+	ctx = outcome.ctx
+	underline = None
+	if ctx._err_start_row is not None:
+		underline = [ctx._err_start_row, ctx._err_end_row, ctx._err_start_col, ctx._err_end_col]
+
+	return {
+		"test": outcome.test_name,
+		"result": outcome.result.name,
+		"marked": outcome.marked,
+		"msg": outcome.msg,
+		"duration_ns": outcome.duration_ns,
+		"timed_out": outcome.timed_out,
+		"benchmark": asdict(outcome.benchmark) if outcome.benchmark is not None else None,
+		"memory": asdict(outcome.memory) if outcome.memory is not None else None,
+		# the context is rebuilt from the coordinator's own copy of the suite
+		"func": ctx.func_name,
+		"line": ctx.line_num,
+		"underline": underline,
+	}
+
+
+def _error_record(test_name: str, msg: str) -> dict:
+	return {
+		"test": test_name, "result": TestResult.Fail.name, "marked": False, "msg": msg, "duration_ns": 0,
+		"timed_out": False, "benchmark": None, "memory": None, "func": None, "line": None, "underline": None,
+	}
+
+
+def outcome_from_record(suite: type, test, record: dict) -> TestOutcome:
+	from .benchmark import BenchmarkStats
+	from .memory import MemoryStats
+
+	# failures in fixtures point at the fixture, not the test
+	func = getattr(suite, record["func"], None) if record["func"] else None
+	if not callable(func):
+		func = test.func
+	underline = tuple(record["underline"]) if record["underline"] else None
+
+	memory = record["memory"]
+	if memory is not None:
+		memory = MemoryStats(memory["peak_bytes"], memory["retained_bytes"], [tuple(site) for site in memory["top_sites"]])
+
+	return TestOutcome(
+		suite_name=suite.__name__,
+		test_name=record["test"],
+		result=getattr(TestResult, record["result"]),
+		marked=record["marked"],
+		ctx=context.from_func(suite, func, record["line"], underline),
+		msg=record["msg"],
+		duration_ns=record["duration_ns"],
+		benchmark=BenchmarkStats(**record["benchmark"]) if record["benchmark"] is not None else None,
+		timed_out=record["timed_out"],
+		memory=memory,
+	)
+
+
+class _coordinator:
+	"""Hands out tests to workers as they ask for them, and collects the records they send back.
+	"""
+
+	def __init__(self, jobs: list[tuple[str, str, str]], limit: _failure_limit = None):
+		self.jobs = jobs
+		self.limit = limit or _failure_limit()
+		self.pending = deque(range(len(jobs)))
+		self.records = {}
+		# the writer and held jobs of each connected worker, by the lock around its writer
+		self.workers = {}
+		self.cond = threading.Condition()
+
+	def _take_batch(self, taken: set[int]) -> list[int]:
+		with self.cond:
+			# a worker that drops out gives its tests back, so wait until every record is in
+			while not self.pending and len(self.records) < len(self.jobs) and not self.limit.reached:
+				self.cond.wait()
+			if self.limit.reached:
+				return []
+
+			# smaller batches as the run nears its end keep the last workers from finishing alone
+			size = min(_max_batch, max(1, len(self.pending) // (4 * len(self.workers))), len(self.pending))
+			batch = [self.pending.popleft() for _ in range(size)]
+			taken.update(batch)
+			return batch
+
+	def _finish(self, job: int, record: dict, taken: set[int]):
+		with self.cond:
+			self.records.setdefault(job, record)
+			taken.discard(job)
+			self.cond.notify_all()
+
+	def _give_back(self, jobs: list[int]):
+		with self.cond:
+			self.pending.extendleft(job for job in reversed(jobs) if job not in self.records)
+			self.cond.notify_all()
+
+	def serve(self, sock: socket.socket):
+		taken = set()
+		lock = threading.Lock()
+		try:
+			with sock, _open(sock, "r") as reader, _open(sock, "w") as writer:
+				with self.cond:
+					self.workers[lock] = (writer, taken)
+
+				while True:
+					message = _receive(reader)
+					if message["type"] == "outcome":
+						self._finish(message["job"], message["outcome"], taken)
+					elif message["type"] == "next":
+						batch = self._take_batch(taken)
+						with lock:
+							if not batch:
+								_send(writer, {"type": "done"})
+								return
+							_send(writer, {"type": "jobs", "jobs": [[job, *self.jobs[job]] for job in batch]})
+		except (OSError, EOFError, ValueError, KeyError):
+			pass
+		finally:
+			with self.cond:
+				self.workers.pop(lock, None)
+				jobs = sorted(taken)
+			self._give_back(jobs)
+
+	def accept(self, server: socket.socket):
+		while True:
+			try:
+				sock, _ = server.accept()
+			except OSError:
+				# the server was closed once the run was over
+				return
+			threading.Thread(target=self.serve, args=(sock,), daemon=True).start()
+
+	def cancel(self, jobs: range):
+		"""Stop handing out the given jobs, ignore any outcomes that still come in for them,
+		and tell the workers holding them not to start them.
+		"""
+		with self.cond:
+			for job in jobs:
+				self.records.setdefault(job, None)
+			self.pending = deque(job for job in self.pending if job not in jobs)
+			held = [(writer, lock, [job for job in taken if job in jobs]) for lock, (writer, taken) in self.workers.items()]
+			self.cond.notify_all()
+
+		for writer, lock, dropped in held:
+			if not dropped:
+				continue
+			try:
+				with lock:
+					_send(writer, {"type": "cancel", "jobs": dropped})
+			except (OSError, ValueError):
+				# the worker is already gone
+				pass
+
+	def records_in_order(self, jobs: range):
+		for job in jobs:
+			with self.cond:
+				while job not in self.records:
+					self.cond.wait()
+				yield self.records[job]
+
+
+def serve_tests(
+	suites: list,
+	address: str,
+	reporter,
+	order: str = None,
+	only: str = None,
+	selected: dict = None,
+	limit: _failure_limit = None,
+) -> int:
+	"""Hand out every test of the given suites to the workers that connect to `address`, and return the number of fails.
+
+	Workers pull a few tests at a time whenever they're free, and send each outcome back as soon as it's done.
+	Results are printed in the same order as a sequential run.
+	"""
+	plans = plan_jobs(suites, order, only, selected)
+	targets = [(suite, suite.tests[index]) for suite, *_, jobs in plans for _, _, index in jobs]
+	coordinator = _coordinator([(suite.__module__, suite.__qualname__, test.name) for suite, test in targets], limit)
+
+	# the jobs of each suite, numbered across the whole run
+	ranges = []
+	for *_, jobs in plans:
+		start = ranges[-1].stop if ranges else 0
+		ranges.append(range(start, start + len(jobs)))
+
+	def suite_outcomes(jobs: range):
+		for job, record in zip(jobs, coordinator.records_in_order(jobs)):
+			suite, test = targets[job]
+			yield outcome_from_record(suite, test, record)
+
+	host, port = parse_address(address)
+	server = socket.create_server((host, port))
+	print(f"serving {len(targets)} tests on {host}:{server.getsockname()[1]}, waiting for workers...", file=sys.stderr)
+	threading.Thread(target=coordinator.accept, args=(server,), daemon=True).start()
+
+	try:
+		outcomes = [suite_outcomes(jobs) for jobs in ranges]
+		return report_plans(plans, outcomes, reporter, limit, lambda i: coordinator.cancel(ranges[i]))
+	finally:
+		server.close()
+
+
+def _connect(address: tuple[str, int]) -> socket.socket:
+	deadline = time.monotonic() + _connect_timeout
+	while True:
+		try:
+			return socket.create_connection(address)
+		except ConnectionRefusedError:
+			if time.monotonic() > deadline:
+				raise Exception(f"Couldn't reach a coordinator at {address[0]}:{address[1]}")
+			time.sleep(0.1)
+
+
+def _run_job(module: str, qualname: str, test_name: str) -> dict:
+	try:
+		suite = _find_suite(module, qualname)
+	except (ImportError, AttributeError) as err:
+		return _error_record(test_name, f"worker couldn't load suite {module}.{qualname}: {err}")
+
+	test = next((test for test in suite.tests if test.name == test_name), None)
+	if test is None:
+		return _error_record(test_name, f"worker has no test \"{test_name}\" in {qualname}")
+
+	return outcome_record(_run_test(suite, test))
+
+
+def _read_messages(reader, messages: queue.Queue, cancelled: set[int]):
+	"""Pass on what the coordinator sends, except for cancelled jobs which are added to `cancelled` right away.
+	"""
+	try:
+		while True:
+			message = _receive(reader)
+			if message["type"] == "cancel":
+				cancelled.update(message["jobs"])
+			else:
+				messages.put(message)
+	except (OSError, EOFError, ValueError):
+		messages.put(None)
+
+
+def run_worker(address: str) -> int:
+	"""Run the tests a coordinator hands out until it has no more, and return 0.
+
+	The worker must be able to import the same test modules as the coordinator,
+	usually by running from a copy of the same project.
+	"""
+	sock = _connect(parse_address(address))
+	try:
+		with sock, _open(sock, "r") as reader, _open(sock, "w") as writer:
+			# messages are read while tests run, so a cancel arrives before the rest of the batch starts
+			messages = queue.Queue()
+			cancelled = set()
+			threading.Thread(target=_read_messages, args=(reader, messages, cancelled), daemon=True).start()
+
+			while True:
+				_send(writer, {"type": "next"})
+				message = messages.get()
+				# the coordinator stops as soon as it has every outcome
+				if message is None or message["type"] == "done":
+					break
+
+				for job, module, qualname, test_name in message["jobs"]:
+					# like once too many tests failed
+					if job in cancelled:
+						continue
+					_send(writer, {"type": "outcome", "job": job, "outcome": _run_job(module, qualname, test_name)})
+	except (OSError, EOFError):
+		pass
+
+	return 0
@@ -1,92 +1,276 @@
 from .context import context
+from .capture import redirect, _stdin, _stdout
+from . import arrays
 
 
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from collections import deque
 from dataclasses import dataclass
+from functools import partial
+from time import perf_counter_ns
 import io
 import sys
 import difflib
+import reprlib
+from itertools import islice
 
 
-def _diff_strings(a: str, b: str):
-	a_res = ""
-	b_res = ""
-
-	for i, s in enumerate(difflib.ndiff(a, b)):
-		if s.startswith('- '):
-			a_res += "\x1b[7m" + s[2:] + "\x1b[27m"
-		elif s.startswith('+ '):
-			b_res += "\x1b[7m" + s[2:] + "\x1b[27m"
-		elif s.startswith('  '):
-			a_res += s[2:]
-			b_res += s[2:]
-
-	return a_res, b_res
+# strings shorter than this with no newlines are diffed inline, one character at a time
+_inline_diff_limit = 1000
+# changed lines longer than this are cut down to the part that changed before diffing
+_line_diff_limit = 400
+# how many characters to keep on either side of a change in a long line
+_line_context = 30
+# above this many lines, changed sections are shown whole instead of being matched line by line,
+# since matching takes quadratic time (1000 lines of mostly changed text take about 30ms)
+_max_matched_lines = 1000
 
 
-def _diff_sets(a: set, b: set):
-	intersection = list(sorted(map(str, a.intersection(b))))
-	a_diff = list(sorted(map(str, a.difference(b))))
-	b_diff = list(sorted(map(str, b.difference(a))))
-	
-	a_res = "{"
-	b_res = "{"
-
-	if len(intersection) > 0:
-		a_res += ", ".join(intersection)
-		if len(a_diff) > 0:
-			a_res += ", "
-		
-		b_res += ", ".join(intersection)
-		if len(b_diff) > 0:
-			b_res += ", "
-	
-	if len(a_diff) > 0:
-		a_res += "\x1b[7m" + ", ".join(a_diff)
-	
-	if len(b_diff) > 0:
-		b_res += "\x1b[7m" + ", ".join(b_diff)
-	
-	a_res += "\x1b[27m" + "}"
-	b_res += "\x1b[27m" + "}"
-
-	return a_res, b_res
+def _highlight(s: str) -> str:
+	return "\x1b[7m" + s + "\x1b[27m" if s else ""
 
 
-def _diff_lists(a: list, b: list):
+def _diff_strings(a: str, b: str):
 	a_res = []
 	b_res = []
 
-	for A, B in zip(a, b):
-		if A == B:
-			a_res.append(str(A))
-			b_res.append(str(B))
+	for tag, a_start, a_end, b_start, b_end in difflib.SequenceMatcher(None, a, b).get_opcodes():
+		if tag == "equal":
+			a_res.append(a[a_start:a_end])
+			b_res.append(b[b_start:b_end])
 		else:
-			a_res.append("\x1b[7m" + str(A) + "\x1b[27m")
-			b_res.append("\x1b[7m" + str(B) + "\x1b[27m")
+			a_res.append(_highlight(a[a_start:a_end]))
+			b_res.append(_highlight(b[b_start:b_end]))
 
-	return "[" + ", ".join(a_res) + "]", "[" + ", ".join(b_res) + "]"
+	return "".join(a_res), "".join(b_res)
 
 
-def _diff_dicts(cfg, plus_color, minus_color, a: dict, b: dict):
-	res = "{\n"
+def _common_prefix_len(a: str, b: str) -> int:
+	# binary search on slices, so long strings are compared at C speed
+	low, high = 0, min(len(a), len(b))
+	while low < high:
+		mid = (low + high + 1) // 2
+		if a[:mid] == b[:mid]:
+			low = mid
+		else:
+			high = mid - 1
+	return low
 
-	for key in a.keys():
-		if not key in b.keys():
-			res += f"{plus_color}+ {' ' * (cfg.tab_width - 2)}{key}: {a.get(key)}\x1b[m\n"
-		elif a.get(key) != b.get(key):
-			res += f"{plus_color}+ {' ' * (cfg.tab_width - 2)}{key}: {a.get(key)}\x1b[m\n"
-			res += f"{minus_color}- {' ' * (cfg.tab_width - 2)}{key}: {b.get(key)}\x1b[m\n"
+
+def _common_suffix_len(a: str, b: str) -> int:
+	low, high = 0, min(len(a), len(b))
+	while low < high:
+		mid = (low + high + 1) // 2
+		if a[len(a) - mid:] == b[len(b) - mid:]:
+			low = mid
 		else:
-			res += f"{' ' * cfg.tab_width}{key}: {b.get(key)}\n"
-	
-	for key in b.keys():
-		if key in a.keys(): continue
+			high = mid - 1
+	return low
+
+
+def _diff_line(a: str, b: str, highlight_chars: bool = True):
+	"""Diff a single changed line, cutting a long line down to the part that changed.
+	"""
+	if len(a) + len(b) <= _line_diff_limit:
+		return _diff_strings(a, b) if highlight_chars else (_highlight(a), _highlight(b))
+
+	start = _common_prefix_len(a, b)
+	end = _common_suffix_len(a[start:], b[start:])
+	a_mid = a[start:len(a) - end]
+	b_mid = b[start:len(b) - end]
+
+	if highlight_chars and len(a_mid) + len(b_mid) <= _line_diff_limit:
+		a_mid, b_mid = _diff_strings(a_mid, b_mid)
+	else:
+		half = _line_diff_limit // 2
+		a_mid = _highlight(a_mid if len(a_mid) <= half else a_mid[:half] + "...")
+		b_mid = _highlight(b_mid if len(b_mid) <= half else b_mid[:half] + "...")
+
+	head = a[max(0, start - _line_context):start]
+	if start > _line_context:
+		head = "..." + head
+	tail = a[len(a) - end:][:_line_context]
+	if end > _line_context:
+		tail += "..."
+
+	return head + a_mid + tail, head + b_mid + tail
+
+
+def _line_opcodes(a: list[str], b: list[str], deadline: float) -> list[tuple]:
+	"""Match up the lines of two texts, skipping the unchanged start and end.
+
+	The changed middle is only matched line by line if it's small enough and there's time left before `deadline`.
+	"""
+	start = 0
+	while start < min(len(a), len(b)) and a[start] == b[start]:
+		start += 1
+	end = 0
+	while end < min(len(a), len(b)) - start and a[-1 - end] == b[-1 - end]:
+		end += 1
+
+	a_end = len(a) - end
+	b_end = len(b) - end
+	a_mid = a[start:a_end]
+	b_mid = b[start:b_end]
+
+	if len(a_mid) + len(b_mid) <= _max_matched_lines and perf_counter_ns() < deadline:
+		middle = [
+			(tag, start + i1, start + i2, start + j1, start + j2)
+			for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a_mid, b_mid).get_opcodes()
+		]
+	else:
+		middle = [("replace", start, a_end, start, b_end)]
+
+	return [("equal", 0, start, 0, start), *middle, ("equal", a_end, len(a), b_end, len(b))]
+
+
+def _diff_text(cfg, plus_color: str, minus_color: str, a: str, b: str) -> str:
+	"""Diff two texts line by line, then character by character inside the changed lines.
+
+	Only `diff_context_lines` unchanged lines are shown around each change, at most `max_diff_lines`
+	changed lines are shown, and character diffs stop once `max_diff_time` seconds have passed.
+	"""
+	deadline = perf_counter_ns() + cfg.max_diff_time * 1e9
+	a_lines = [repr(line)[1:-1] for line in a.split("\n")]
+	b_lines = [repr(line)[1:-1] for line in b.split("\n")]
+	opcodes = _line_opcodes(a_lines, b_lines, deadline)
+
+	context = cfg.diff_context_lines
+	total_changed = sum(i2 - i1 + j2 - j1 for tag, i1, i2, j1, j2 in opcodes if tag != "equal")
+	shown = 0
+	res = []
+
+	for n, (tag, a_start, a_end, b_start, b_end) in enumerate(opcodes):
+		if tag == "equal":
+			lines = a_lines[a_start:a_end]
+			# keep the lines just after the previous change and just before the next one
+			keep_head = context if n > 0 else 0
+			keep_tail = context if n < len(opcodes) - 1 else 0
+			if len(lines) > keep_head + keep_tail:
+				lines = lines[:keep_head] + ["..."] + (lines[-keep_tail:] if keep_tail else [])
+			res.extend(f"  {line}" for line in lines)
+			continue
+
+		# lines are only diffed as they're shown, so a huge change costs no more than `max_diff_lines`
+		for i in range(max(a_end - a_start, b_end - b_start)):
+			a_line = a_lines[a_start + i] if a_start + i < a_end else None
+			b_line = b_lines[b_start + i] if b_start + i < b_end else None
+			if a_line is not None and b_line is not None:
+				a_line, b_line = _diff_line(a_line, b_line, perf_counter_ns() < deadline)
+
+			for sign, color, line in (("+", plus_color, a_line), ("-", minus_color, b_line)):
+				if line is None:
+					continue
+				if shown == cfg.max_diff_lines:
+					res.append(f"... and {total_changed - shown} more changed lines")
+					return "\n".join(res)
+				res.append(f"{color}{sign} {line}\x1b[m")
+				shown += 1
+
+	return "\n".join(res)
+
+
+def _describe_string_diff(parent, a: str, b: str) -> str:
+	"""Describe how two strings differ, inline if they're short and line by line otherwise.
+	"""
+	if "\n" not in a and "\n" not in b and len(a) + len(b) <= _inline_diff_limit:
+		a, b = _diff_strings(repr(a)[1:-1], repr(b)[1:-1])
+		return (
+			f"\x1b[22m{parent.color.expected}+ {a}\n"
+			f"\x1b[22m{parent.color.received}- {b}"
+		)
 
-		res += f"{minus_color}- {' ' * (cfg.tab_width - 2)}{key}: {b.get(key)}\x1b[m\n"
+	return _diff_text(
+		parent.config,
+		parent.color.expected + "\x1b[22m",
+		parent.color.received + "\x1b[22m",
+		a,
+		b,
+	)
+
+
+# stands in for a key or element that only one side has
+_missing = object()
+
+_short_repr = reprlib.Repr()
+_short_repr.maxlevel = 3
+_short_repr.maxstring = _short_repr.maxother = 80
+_short_repr.maxlist = _short_repr.maxtuple = _short_repr.maxset = _short_repr.maxdict = 10
+
+
+def _values_differ(a, b) -> bool:
+	if arrays.is_array(a) or arrays.is_array(b):
+		return arrays.find_mismatch(a, b, 0) is not None
+	try:
+		return bool(a != b)
+	except (ValueError, TypeError):
+		# containers holding numpy arrays can't be compared with `!=`, so they're walked element by element
+		return next(_walk_diffs(a, b), None) is not None
+
+
+def _key_path(path: str, key) -> str:
+	if isinstance(key, str) and key.isidentifier():
+		return f"{path}.{key}" if path else key
+	return f"{path}[{key!r}]"
+
+
+def _walk_diffs(a, b, path: str = ""):
+	"""Yield `(path, a, b)` for every difference between two values, only descending into branches that differ.
+	"""
+	if isinstance(a, dict) and isinstance(b, dict):
+		for key, value in a.items():
+			if key not in b:
+				yield _key_path(path, key), value, _missing
+			elif _values_differ(value, b[key]):
+				yield from _walk_diffs(value, b[key], _key_path(path, key))
+		for key, value in b.items():
+			if key not in a:
+				yield _key_path(path, key), _missing, value
+
+	elif isinstance(a, (list, tuple)) and type(a) is type(b):
+		for i in range(min(len(a), len(b))):
+			if _values_differ(a[i], b[i]):
+				yield from _walk_diffs(a[i], b[i], f"{path}[{i}]")
+		# elements past the end of the shorter one
+		for i in range(len(b), len(a)):
+			yield f"{path}[{i}]", a[i], _missing
+		for i in range(len(a), len(b)):
+			yield f"{path}[{i}]", _missing, b[i]
+
+	elif isinstance(a, (set, frozenset)) and isinstance(b, (set, frozenset)):
+		only_a = a - b
+		only_b = b - a
+		if only_a or only_b:
+			yield path, only_a or _missing, only_b or _missing
+
+	else:
+		yield path, a, b
+
+
+def _diff_structures(cfg, plus_color: str, minus_color: str, a, b) -> str:
+	"""Describe the differences between two nested values, one line per difference, up to `max_diffs` of them.
+	"""
+	res = []
+
+	for n, (path, a_value, b_value) in enumerate(_walk_diffs(a, b)):
+		if n == cfg.max_diffs:
+			res.append("... and more differences")
+			break
+
+		if isinstance(a_value, str) and isinstance(b_value, str):
+			a_value, b_value = _diff_line(repr(a_value), repr(b_value))
+		else:
+			a_value = None if a_value is _missing else _short_repr.repr(a_value)
+			b_value = None if b_value is _missing else _short_repr.repr(b_value)
 
-	res += "}"
-	
-	return res
+		line = [f"{path}:"] if path else []
+		if a_value is not None:
+			line.append(f"{plus_color}+ {a_value}\x1b[m")
+		if b_value is not None:
+			line.append(f"{minus_color}- {b_value}\x1b[m")
+		res.append(" ".join(line))
+
+	return "\n".join(res)
 
 
 @dataclass
@@ -107,8 +291,81 @@ class call_with:
 		return self
 
 
+@dataclass
+class case_results:
+	"""How many cases `expect.function.run_with_cases` ran, and how long they took.
+	"""
+	cases: int = 0
+	fails: int = 0
+	duration_ns: int = 0
+
+	@property
+	def cases_per_sec(self) -> float:
+		return self.cases / (self.duration_ns / 1e9) if self.duration_ns else 0.0
+
+
+def _run_case_chunk(fn: callable, cases: list[call_with]) -> tuple[int, list]:
+	"""Run a chunk of cases, and return how many ran along with the failing ones.
+
+	Passing cases aren't kept, so chunks are cheap to send back from another process.
+	"""
+	fails = []
+
+	for c in cases:
+		try:
+			if fn(*c.args, **c.kwargs) != c.returns:
+				fails.append((c, None))
+		except TestFailException as test_fail:
+			fails.append(test_fail)
+		except Exception as err:
+			fails.append((c, f"{err.__class__.__name__}: {err}"))
+
+	return len(cases), fails
+
+
+def _chunked(items, size: int):
+	items = iter(items)
+	while chunk := list(islice(items, size)):
+		yield chunk
+
+
+def _map_bounded(pool: Executor, fn: callable, items, limit: int):
+	"""Like `pool.map`, but only takes `limit` items from `items` ahead of the results.
+	"""
+	pending = deque()
+
+	for item in items:
+		pending.append(pool.submit(fn, item))
+		if len(pending) >= limit:
+			yield pending.popleft().result()
+
+	while pending:
+		yield pending.popleft().result()
+
+
+_frame_funcs = {}
+def _register_frame_func(parent, func: callable):
+	"""Index a function by its code object so `_get_frame_func` can find it without searching.
+	"""
+	code = getattr(func, "__code__", None)
+	if code is not None:
+		_frame_funcs.setdefault(code, (parent, func))
+
+
+def _unregister_frame_funcs(parent):
+	"""Forget every function that was indexed for `parent`.
+	"""
+	for code in [code for code, (p, _) in _frame_funcs.items() if p is parent]:
+		del _frame_funcs[code]
+
+
 _primitive_types = (bool, str, int, float, type(None))
 def _get_frame_func(frame, max_depth: int = 15):
+	# registered suite functions can be looked up directly
+	found = _frame_funcs.get(frame.f_code)
+	if found is not None:
+		return found
+
 	from .soaper import TestSuite
 	# put together a dict of objects to check
 	# priority goes to test suites, then locals, then globals
@@ -152,18 +409,42 @@ def _get_frame_func(frame, max_depth: int = 15):
 	return None, None
 
 
+def _get_underline(frame) -> tuple[int, int, int, int]:
+	"""Get the source position of the instruction a frame is currently executing.
+	"""
+	return _position_at(frame.f_code, frame.f_lasti)
+
+
+def _position_at(code, lasti: int) -> tuple[int, int, int, int]:
+	"""Get the source position of the instruction at offset `lasti` in `code`.
+	"""
+	return next(islice(code.co_positions(), lasti // 2, None))
+
+
 class expect:
+	# a passing assertion should only ever allocate this object
+	__slots__ = ("value", "_frame", "_parent")
+
 	def __init__(self, value: any, _frame = None, _parent = None):
 		self.value = value
-		self._frame = _frame or sys._getframe().f_back
+		self._frame = _frame
 		self._parent = _parent
 
+	def _caller(self):
+		"""Get the frame of the test that called the assertion, capturing it on first use.
+		"""
+		if self._frame is None:
+			# _caller <- parent/_fail <- assertion method <- test
+			self._frame = sys._getframe(3)
+
+		return self._frame
+
 	@property
 	def parent(self):
-		"""Get the parent class of the method that called `expect.__init__`.
+		"""Get the parent class of the method that called the assertion.
 		"""
 		if self._parent is None:
-			self._parent, _ = _get_frame_func(self._frame)
+			self._parent, _ = _get_frame_func(self._caller())
 
 		return self._parent
 
@@ -177,13 +458,10 @@ class expect:
 	def _fail(self, msg: str):
 		"""Fail the current test.
 		"""
-		frame = self._frame
-
-		positions = list(frame.f_code.co_positions())
-		underline = positions[frame.f_lasti // 2]
+		frame = self._caller()
 
 		raise TestFailException(
-			context.from_frame(self.parent, frame, frame.f_lineno, underline),
+			context.from_frame(self.parent, frame, frame.f_lineno, _get_underline(frame)),
 			msg or "Internal failure",
 		)
 
@@ -199,11 +477,8 @@ class expect:
 		"""
 		parent = _get_frame_func(frame)
 
-		positions = list(frame.f_code.co_positions())
-		underline = positions[frame.f_lasti // 2]
-
 		return TestFailException(
-			context.from_frame(parent[0], frame, frame.f_lineno, underline),
+			context.from_frame(parent[0], frame, frame.f_lineno, _get_underline(frame)),
 			msg,
 		)
 
@@ -227,41 +502,83 @@ class expect:
 			self.desc = desc
 			return self
 
-		def run_with_cases(self, *cases: list[call_with]):
-			"""Runs a set of test cases on the given function.
+		def run_with_cases(
+			self,
+			*cases: list[call_with],
+			workers: int = 0,
+			threads: int = 0,
+			chunk_size: int = 1000,
+			max_fails: int = 10,
+		) -> case_results:
+			"""Runs a set of test cases on the given function, and return how many ran and how fast.
+
+			`cases` can also be a single iterable or generator of cases, which is consumed one chunk at a time.
 			"""
+			# failures are reported against the test that called us
+			frame = sys._getframe().f_back
+			start = perf_counter_ns()
+
+			if len(cases) == 1 and not isinstance(cases[0], call_with):
+				cases = cases[0]
+
+			chunks = _chunked(cases, chunk_size)
 			fails = []
+			results = case_results()
+
+			if workers > 1:
+				pool = ProcessPoolExecutor(workers)
+			elif threads > 1:
+				pool = ThreadPoolExecutor(threads)
+			else:
+				pool = None
+
+			try:
+				if pool is None:
+					chunk_results = (_run_case_chunk(self.fn, chunk) for chunk in chunks)
+				else:
+					chunk_results = _map_bounded(pool, partial(_run_case_chunk, self.fn), chunks, max(workers, threads) * 2)
+
+				for count, chunk_fails in chunk_results:
+					results.cases += count
+					results.fails += len(chunk_fails)
+					fails.extend(chunk_fails[:max_fails - len(fails)])
+			finally:
+				if pool is not None:
+					pool.shutdown(cancel_futures=True)
+
+			results.duration_ns = perf_counter_ns() - start
 
-			for c in cases:
-				try:
-					res = self.fn(*c.args, **c.kwargs)
+			# with `max_fails=0` no failures are kept, but the count still fails the test
+			if results.fails:
+				ctx = expect._get_fail(frame).ctx
+				msgs = [
+					f if isinstance(f, TestFailException) else TestFailException(ctx, self._describe_fail(*f))
+					for f in fails
+				]
 
-					if res != c.returns:
-						msg = self.desc.format(*c.args, c.returns)
-						fails.append(expect._get_fail(sys._getframe(), msg))
-				except TestFailException as test_fail:
-					fails.append(test_fail)
-				except BaseException as err:
-					traceback = err.__traceback__
+				if fails and results.fails > len(fails):
+					msgs.append(TestFailException(ctx, f"...and {results.fails - len(fails)} more failures"))
+				msgs.append(TestFailException(ctx, f"{results.fails} of {results.cases} cases failed ({results.cases_per_sec:,.0f} cases/sec)"))
 
-					msg = err.__class__.__name__ + ": " + err.args[0]
+				raise Exception(msgs)
 
-					fail = expect._get_fail(sys._getframe(), msg)
-					fail.ctx._line_num = traceback.tb_lineno - 1
-					fails.append(fail)
+			return results
 
-			if fails:
-				raise Exception(fails)
+		def _describe_fail(self, case: call_with, err: str):
+			if err is not None:
+				return err
+			return self.desc.format(*case.args, case.returns)
 
 	class with_stdin:
 		"""Use inside a with statement to simulate stdin.
 		"""
 		def __init__(self, text: str):
 			self.buffer = io.StringIO(text)
+			self._redirect = redirect(_stdin, self.buffer)
 		def __enter__(self):
-			sys.stdin = self.buffer
+			self._redirect.__enter__()
 		def __exit__(self, err_type, err_value, traceback):
-			sys.stdin = sys.__stdin__
+			self._redirect.__exit__(err_type, err_value, traceback)
 	
 	class to_give_stdout:
 		"""Use inside a with statement to capture stdout.
@@ -269,26 +586,17 @@ class expect:
 		def __init__(self, text: str):
 			self.buffer = io.StringIO()
 			self.expected = text
-
-			self._frame = sys._getframe().f_back
-			self._parent, _ = _get_frame_func(self._frame)
+			self._redirect = redirect(_stdout, self.buffer)
 		def __enter__(self):
-			sys.stdout = self.buffer
+			self._redirect.__enter__()
 		def __exit__(self, err_type, err_value, traceback):
-			sys.stdout = sys.__stdout__
+			self._redirect.__exit__(err_type, err_value, traceback)
 			buf = self.buffer.getvalue()
 			if self.expected != buf:
-				frame = self._frame
-
-				positions = list(frame.f_code.co_positions())
-				underline = positions[frame.f_lasti // 2]
-
-				a, b = _diff_strings(repr(self.expected)[1:-1], repr(buf)[1:-1])
-				raise TestFailException(
-					context.from_frame(self._parent, frame, frame.f_lineno, underline),
+				fail = expect(None, sys._getframe().f_back)
+				fail._fail(
 					"expected stdout to equal\n\n"
-					f"\x1b[22m{self._parent.color.expected}+ {a}\n"
-					f"\x1b[22m{self._parent.color.received}- {b}"
+					+ _describe_string_diff(fail.parent, self.expected, buf)
 				)
 	
 	class to_raise:
@@ -296,14 +604,11 @@ class expect:
 		"""
 		def __init__(self, exception):
 			self.exc = exception
-
-			frame = sys._getframe().f_back
-			parent, _ = _get_frame_func(frame)
-			self.expect = expect(None, frame, parent)
 		def __enter__(self): pass
 		def __exit__(self, err_type, err_value, traceback):
 			if err_type != self.exc:
-				self.expect._fail(f"expected to raise {self.exc.__name__}")
+				fail = expect(None, sys._getframe().f_back)
+				fail._fail(f"expected to raise {self.exc.__name__}")
 			else:
 				return True
 	
@@ -312,15 +617,12 @@ class expect:
 		"""
 		def __init__(self, exception):
 			self.exc = exception
-
-			frame = sys._getframe().f_back
-			parent, _ = _get_frame_func(frame)
-			self.expect = expect(None, frame, parent)
 		def __enter__(self): pass
 		def __exit__(self, err_type, err_value, traceback):
-			if self.err_type == self.exc:
-				err_name = self.exc.__class__.__name__
-				self.expect._fail(f"expected not to raise {err_name}")
+			if err_type == self.exc:
+				err_name = self.exc.__name__
+				fail = expect(None, sys._getframe().f_back)
+				fail._fail(f"expected not to raise {err_name}")
 	
 	def truthy(self):
 		if self.value: return
@@ -331,21 +633,25 @@ class expect:
 		self._fail("expected a falsy value")
 	
 	def to_equal(self, value):
-		if self.value == value: return
+		try:
+			equal = self.value == value
+		except (ValueError, TypeError):
+			# containers holding numpy arrays can't be compared with `==`
+			equal = not _values_differ(self.value, value)
+		# checked first, so passing assertions never pay for the array checks below
+		if equal is True: return
+
+		# `==` on numpy arrays gives an array, so they're compared separately
+		if arrays.is_array(self.value) or arrays.is_array(value):
+			return self._expect_arrays_match(value)
+		if equal: return
 		match self.value:
-			case str():
-				name = "strings"
-				a, b = _diff_strings(repr(self.value)[1:-1], repr(value)[1:-1])
-			case set():
-				name = "sets"
-				a, b = _diff_sets(self.value, value)
-			case list():
-				name = "lists"
-				a, b = _diff_lists(self.value, value)
-			case dict():
+			case str() if isinstance(value, str):
+				self._fail("expected strings to equal\n\n" + _describe_string_diff(self.parent, self.value, value))
+			case set() | list() | tuple() | dict():
 				self._fail(
-					f"expected dicts to equal\n\n"
-					+ "dict " + _diff_dicts(
+					f"expected {type(self.value).__name__}s to equal\n\n"
+					+ _diff_structures(
 						self.parent.config,
 						self.parent.color.expected + "\x1b[22m",
 						self.parent.color.received + "\x1b[22m",
@@ -364,7 +670,10 @@ class expect:
 		)
 	
 	def to_not_equal(self, value):
-		if self.value != value: return
+		try:
+			if self.value != value: return
+		except (ValueError, TypeError):
+			if _values_differ(self.value, value): return
 		self._fail(
 			"expected values to not equal\n\n"
 			f"expected: \x1b[22m{self.parent.color.expected}not {self.value}\n"
@@ -415,10 +724,18 @@ class expect:
 			f"received: \x1b[22m{self.parent.color.received} {value}"
 		)
 	
-	def close_to(self, value, precision: int = 2):
-		diff = float(abs(self.value - value))
+	def close_to(self, value, precision: int = 2, atol: float = None, rtol: float = 0.0):
 		max_diff = float((10 ** -precision) / 2)
-		if diff < max_diff: return
+		if arrays.is_array(self.value) or arrays.is_array(value):
+			return self._expect_arrays_match(value, (max_diff if atol is None else atol, rtol))
+
+		diff = float(abs(self.value - value))
+		if atol is None and not rtol:
+			if diff < max_diff: return
+		else:
+			max_diff = (max_diff if atol is None else atol) + rtol * float(abs(self.value))
+			if diff <= max_diff: return
+
 		self._fail(
 			f"expected: \x1b[22m{self.parent.color.expected}{self.value}\x1b[m\n"
 			f"received: \x1b[22m{self.parent.color.received}{value}\x1b[m\n"
@@ -428,6 +745,24 @@ class expect:
 			f"received difference: \x1b[22m{self.parent.color.received}{diff}\x1b[m"
 		)
 
+	def _expect_arrays_match(self, value, tolerance: tuple[float, float] = None):
+		"""Compare arrays element by element, failing with a summary of where they differ.
+		"""
+		if self._frame is None:
+			# _expect_arrays_match <- assertion method <- test
+			self._frame = sys._getframe(2)
+
+		m = arrays.find_mismatch(self.value, value, self.parent.config.array_diff_items, tolerance)
+		if m is None: return
+		self._fail(
+			f"expected arrays to {'equal' if tolerance is None else 'be close'}\n\n"
+			+ arrays.describe(
+				m,
+				self.parent.color.expected + "\x1b[22m",
+				self.parent.color.received + "\x1b[22m",
+			)
+		)
+
 	def to_be_type(self, value):
 		if isinstance(self.value, value): return
 		self._fail(
@@ -0,0 +1,228 @@
+from .context import context
+from .expect import TestFailException, _position_at
+
+
+from dataclasses import dataclass
+from inspect import Parameter, isgenerator, signature
+from multiprocessing.util import Finalize, register_after_fork
+from time import perf_counter_ns
+import sys
+import threading
+
+
+scopes = ("test", "suite", "session")
+
+
+@dataclass(frozen=True, slots=True)
+class FixtureInfo:
+	"""A fixture found on a suite when the suite was created.
+	"""
+
+	name: str
+	func: callable
+	scope: str
+	# the fixtures it takes, by parameter name
+	params: tuple[str, ...]
+
+
+def params_of(func: callable) -> tuple[str, ...]:
+	"""Get the fixtures a function asks for, which are its named parameters without a default.
+	"""
+	return tuple(
+		name for name, param in signature(func).parameters.items()
+		if param.default is Parameter.empty and param.kind not in (Parameter.VAR_POSITIONAL, Parameter.VAR_KEYWORD)
+	)
+
+
+def check_fixtures(cls, tests: tuple, fixtures: dict[str, FixtureInfo]):
+	"""Make sure every test and fixture only asks for fixtures that exist and live at least as long as it does.
+	"""
+	for test in tests:
+		for name in test.fixtures:
+			if name not in fixtures:
+				raise Exception(f"Test \"{test.name}\" of {cls.__name__} takes unknown fixture \"{name}\"")
+
+	for fixture in fixtures.values():
+		for name in fixture.params:
+			if name not in fixtures:
+				raise Exception(f"Fixture \"{fixture.name}\" of {cls.__name__} takes unknown fixture \"{name}\"")
+			if scopes.index(fixtures[name].scope) < scopes.index(fixture.scope):
+				raise Exception(
+					f"{fixture.scope.capitalize()} fixture \"{fixture.name}\" of {cls.__name__} "
+					f"can't use {fixtures[name].scope} fixture \"{name}\""
+				)
+
+
+def used_by(cls, names: tuple[str, ...]) -> list[FixtureInfo]:
+	"""Get the given fixtures and every fixture they use, each once.
+	"""
+	found = {}
+	pending = list(names)
+	while pending:
+		name = pending.pop()
+		if name not in found:
+			found[name] = cls.fixtures[name]
+			pending.extend(found[name].params)
+	return list(found.values())
+
+
+def _failure(cls, fixture: FixtureInfo, err: BaseException, action: str) -> TestFailException:
+	"""Point a fixture's error at the line of the fixture that raised it.
+	"""
+	tb = err.__traceback__
+	while tb is not None and tb.tb_frame.f_code is not fixture.func.__code__:
+		tb = tb.tb_next
+
+	if tb is None:
+		ctx = context.from_func(cls, fixture.func)
+	else:
+		ctx = context.from_func(cls, fixture.func, tb.tb_lineno, _position_at(tb.tb_frame.f_code, tb.tb_lasti))
+
+	err_name = err.__class__.__name__
+	err_msg = f"{err_name}: {err}" if str(err) else err_name
+	return TestFailException(ctx, f"fixture \"{fixture.name}\" threw during {action} \x1b[22m{cls.color.received}{err_msg}")
+
+
+class scope:
+	"""The fixture values built for one test, suite or session, torn down in the reverse order they were built.
+	"""
+
+	def __init__(self):
+		# keyed by function, so a fixture inherited by several suites is only built once per session
+		self.values = {}
+		self.errors = {}
+		self.teardowns = []
+		self.lock = threading.RLock()
+		self.setup_ns = 0
+		self.teardown_ns = 0
+
+	def teardown(self, cls = None) -> list[TestFailException]:
+		"""Finish every generator fixture, and return a failure for each one that raised.
+		"""
+		failures = []
+		start = perf_counter_ns()
+
+		with self.lock:
+			while self.teardowns:
+				owner, fixture, gen = self.teardowns.pop()
+				try:
+					next(gen)
+				except StopIteration:
+					pass
+				except Exception as err:
+					failures.append(_failure(cls or owner, fixture, err, "teardown"))
+				else:
+					gen.close()
+					failures.append(_failure(cls or owner, fixture, Exception("yielded more than once"), "teardown"))
+
+			self.values.clear()
+			self.errors.clear()
+
+		self.teardown_ns += perf_counter_ns() - start
+		return failures
+
+
+_session = scope()
+_suites = {}
+_suites_lock = threading.Lock()
+
+
+def _scope_for(cls, fixture: FixtureInfo, test_scope: scope) -> scope:
+	if fixture.scope == "test":
+		return test_scope
+	if fixture.scope == "session":
+		return _session
+
+	with _suites_lock:
+		if cls not in _suites:
+			_suites[cls] = scope()
+		return _suites[cls]
+
+
+def _get(cls, fixture: FixtureInfo, test_scope: scope):
+	owner = _scope_for(cls, fixture, test_scope)
+
+	with owner.lock:
+		if fixture.func in owner.values:
+			return owner.values[fixture.func]
+		# a fixture that failed isn't built again for every test that needs it
+		if fixture.func in owner.errors:
+			raise owner.errors[fixture.func]
+
+		args = {name: _get(cls, cls.fixtures[name], test_scope) for name in fixture.params}
+
+		start = perf_counter_ns()
+		try:
+			value = fixture.func(**args)
+			if isgenerator(value):
+				gen = value
+				value = next(gen)
+				owner.teardowns.append((cls, fixture, gen))
+		except Exception as err:
+			owner.errors[fixture.func] = _failure(cls, fixture, err, "setup")
+			raise owner.errors[fixture.func]
+		finally:
+			owner.setup_ns += perf_counter_ns() - start
+
+		owner.values[fixture.func] = value
+		return value
+
+
+def resolve(cls, names: tuple[str, ...], test_scope: scope) -> dict[str, any]:
+	"""Get the values of the given fixtures for a test, building any that haven't been yet.
+	"""
+	return {name: _get(cls, cls.fixtures[name], test_scope) for name in names}
+
+
+def end_suite(cls) -> tuple[scope, list[TestFailException]]:
+	"""Tear down a suite's fixtures, and return its scope (for the timings) along with any teardown failures.
+	"""
+	with _suites_lock:
+		suite_scope = _suites.pop(cls, None)
+
+	if suite_scope is None:
+		return None, []
+	return suite_scope, suite_scope.teardown(cls)
+
+
+def _print_failures(failures: list[TestFailException]):
+	for failure in failures:
+		print(f"{failure.ctx.rel_name}:{failure.ctx.line_num}: {failure.msg}\x1b[m", file=sys.stderr)
+
+
+def end_session() -> int:
+	"""Tear down the session's fixtures, print any failures, and return how many there were.
+	"""
+	failures = _session.teardown()
+	_print_failures(failures)
+	return len(failures)
+
+
+def _teardown_all():
+	"""Tear down whatever is left when the process exits, including in worker processes.
+	"""
+	with _suites_lock:
+		remaining = list(_suites.items())
+		_suites.clear()
+
+	for cls, suite_scope in remaining:
+		_print_failures(suite_scope.teardown(cls))
+	end_session()
+
+
+def _register_teardown():
+	# runs at exit in the main process and in `multiprocessing` workers, which skip `atexit`
+	Finalize(None, _teardown_all, exitpriority=10)
+
+
+def _after_fork(_):
+	"""Start a forked worker with no fixtures, since the ones it inherited belong to the parent.
+	"""
+	global _session
+	_session = scope()
+	_suites.clear()
+	_register_teardown()
+
+
+_register_teardown()
+register_after_fork(_teardown_all, _after_fork)
@@ -0,0 +1,42 @@
+from .soaper import _test_key
+from . import cache
+
+
+# keys of the tests that failed the last time they ran
+_failed = None
+_changed = False
+
+
+def _get_failed() -> set[str]:
+	global _failed
+	if _failed is None:
+		_failed = set(cache.load("lastfailed").get("failed", []))
+	return _failed
+
+
+def has_failures() -> bool:
+	return len(_get_failed()) > 0
+
+
+def last_failed(cls: any, test_name: str) -> bool:
+	return _test_key(cls, test_name) in _get_failed()
+
+
+def record(cls: any, test_name: str, failed: bool):
+	global _changed
+	failed_tests = _get_failed()
+	key = _test_key(cls, test_name)
+
+	if failed and key not in failed_tests:
+		failed_tests.add(key)
+		_changed = True
+	elif not failed and key in failed_tests:
+		failed_tests.remove(key)
+		_changed = True
+
+
+def save():
+	global _changed
+	if _changed:
+		cache.save("lastfailed", {"failed": sorted(_failed)})
+		_changed = False
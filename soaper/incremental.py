@@ -0,0 +1,130 @@
+from .soaper import _test_key
+from . import cache
+
+
+from hashlib import sha256
+from types import CodeType, FunctionType, ModuleType
+import os
+import sys
+
+
+# test key -> {"hash": ..., "passed": ...} from previous runs
+_results = None
+_file_fingerprints = {}
+
+
+def _get_results() -> dict:
+	global _results
+	if _results is None:
+		_results = cache.load("incremental")
+	return _results
+
+
+def clear_fingerprints():
+	"""Forget the fingerprints of every source file, so files that changed since are read again.
+	"""
+	_file_fingerprints.clear()
+
+
+def _file_fingerprint(path: str) -> str:
+	if path not in _file_fingerprints:
+		try:
+			stat = os.stat(path)
+			_file_fingerprints[path] = f"{path}:{stat.st_mtime_ns}:{stat.st_size}"
+		except OSError:
+			_file_fingerprints[path] = f"{path}:missing"
+
+	return _file_fingerprints[path]
+
+
+def _module_fingerprint(name: str) -> str:
+	module = sys.modules.get(name)
+	path = getattr(module, "__file__", None)
+	return _file_fingerprint(path) if path else name
+
+
+def _hash_code(code: CodeType, digest):
+	"""Add a code object, and every code object nested in it, to the hash.
+	"""
+	digest.update(code.co_code)
+	digest.update(repr(code.co_names).encode())
+
+	for const in code.co_consts:
+		if isinstance(const, CodeType):
+			_hash_code(const, digest)
+		else:
+			digest.update(repr(const).encode())
+
+
+def _global_names(code: CodeType) -> set[str]:
+	names = set(code.co_names)
+	for const in code.co_consts:
+		if isinstance(const, CodeType):
+			names |= _global_names(const)
+	return names
+
+
+def _hash_dependencies(func: FunctionType, digest, seen: set):
+	"""Add everything the function refers to through its globals to the hash.
+
+	Functions are followed into their own code, everything else is identified by the
+	source file of the module that defines it.
+	"""
+	for name in sorted(_global_names(func.__code__)):
+		value = func.__globals__.get(name)
+
+		if isinstance(value, ModuleType):
+			digest.update(_module_fingerprint(value.__name__).encode())
+		elif isinstance(value, FunctionType):
+			if value.__code__ in seen:
+				continue
+			seen.add(value.__code__)
+			_hash_code(value.__code__, digest)
+			_hash_dependencies(value, digest, seen)
+		elif isinstance(value, (type, bool, int, float, str, type(None))):
+			digest.update(f"{name}={value!r}".encode())
+			module = getattr(value, "__module__", None)
+			if isinstance(value, type) and module:
+				digest.update(_module_fingerprint(module).encode())
+
+
+def fingerprint(func: FunctionType) -> str:
+	"""Hash a test's bytecode and constants, along with the functions and modules it uses.
+	"""
+	digest = sha256()
+	seen = {func.__code__}
+	_hash_code(func.__code__, digest)
+	_hash_dependencies(func, digest, seen)
+	return digest.hexdigest()
+
+
+def _test_fingerprint(cls: any, test) -> str:
+	"""Fingerprint a test along with every fixture it uses.
+	"""
+	if not test.fixtures:
+		return fingerprint(test.func)
+
+	from .fixtures import used_by
+	digest = sha256(fingerprint(test.func).encode())
+	for fixture in sorted(used_by(cls, test.fixtures), key=lambda f: f.name):
+		digest.update(f"{fixture.name}:{fixture.scope}:{fingerprint(fixture.func)}".encode())
+	return digest.hexdigest()
+
+
+def is_cached_pass(cls: any, test) -> bool:
+	"""Check if a test passed last time and hasn't changed since.
+	"""
+	entry = _get_results().get(_test_key(cls, test.name))
+	return bool(entry and entry["passed"] and entry["hash"] == _test_fingerprint(cls, test))
+
+
+def record(cls: any, test, passed: bool):
+	_get_results()[_test_key(cls, test.name)] = {
+		"hash": _test_fingerprint(cls, test),
+		"passed": passed,
+	}
+
+
+def save():
+	if _results is not None:
+		cache.save("incremental", _results)
@@ -0,0 +1,124 @@
+from .context import _display_path
+
+
+from dataclasses import dataclass, field
+import gc
+import os
+import threading
+import tracemalloc
+
+
+@dataclass
+class MemoryStats:
+	"""How much memory a single test allocated, in bytes.
+	"""
+
+	peak_bytes: int
+	retained_bytes: int
+	# the lines holding the most new memory once the test ended, as ("file:line", bytes)
+	top_sites: list[tuple[str, int]] = field(default_factory=list)
+
+
+def format_bytes(n: int) -> str:
+	for unit in ("B", "KiB", "MiB"):
+		if abs(n) < 1024:
+			return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+		n /= 1024
+	return f"{n:.2f}GiB"
+
+
+# soaper's own allocations, and tracemalloc's, aren't the test's fault
+_ignored_files = [
+	tracemalloc.Filter(False, tracemalloc.__file__),
+	tracemalloc.Filter(False, os.path.join(os.path.dirname(__file__), "*")),
+]
+
+
+# how many tests are being measured at once, so tracing only stops after the last one
+_measuring = 0
+_measuring_lock = threading.Lock()
+_started_tracing = False
+
+
+def _start():
+	global _measuring, _started_tracing
+	with _measuring_lock:
+		if _measuring == 0 and not tracemalloc.is_tracing():
+			tracemalloc.start()
+			_started_tracing = True
+		_measuring += 1
+
+
+def _stop():
+	global _measuring, _started_tracing
+	with _measuring_lock:
+		_measuring -= 1
+		# tracing someone else started is left running
+		if _measuring == 0 and _started_tracing:
+			tracemalloc.stop()
+			_started_tracing = False
+
+
+def _top_sites(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, limit: int) -> list[tuple[str, int]]:
+	diffs = after.filter_traces(_ignored_files).compare_to(before.filter_traces(_ignored_files), "lineno")
+	sites = []
+	for diff in diffs:
+		if diff.size_diff <= 0 or len(sites) == limit:
+			break
+		frame = diff.traceback[0]
+		sites.append((f"{_display_path(frame.filename)}:{frame.lineno}", diff.size_diff))
+	return sites
+
+
+def measure(call: callable, top_sites: int = 0) -> MemoryStats:
+	"""Run `call`, and measure its peak memory and how much of it is still held afterwards.
+
+	Memory is measured with tracemalloc, which is started if it isn't already running.
+	It counts every thread's allocations, so tests running alongside this one are counted too.
+	Snapshots for `top_sites` are only taken when it's more than 0, since they're slow.
+	"""
+	_start()
+	try:
+		gc.collect()
+		before = tracemalloc.take_snapshot() if top_sites > 0 else None
+		start_bytes, _ = tracemalloc.get_traced_memory()
+		tracemalloc.reset_peak()
+
+		call()
+
+		_, peak_bytes = tracemalloc.get_traced_memory()
+		# anything only kept alive by reference cycles isn't really retained
+		gc.collect()
+		end_bytes, _ = tracemalloc.get_traced_memory()
+
+		# the snapshot is taken before anything else is allocated here
+		after = tracemalloc.take_snapshot() if before is not None and end_bytes > start_bytes else None
+		# memory the test freed from before it started isn't counted against it
+		stats = MemoryStats(max(peak_bytes - start_bytes, 0), max(end_bytes - start_bytes, 0))
+		if after is not None:
+			stats.top_sites = _top_sites(before, after, top_sites)
+		return stats
+	finally:
+		_stop()
+
+
+def check_limits(cls: any, test, stats: MemoryStats):
+	"""Fail the test if it went over its `max_memory` or `max_retained`.
+	"""
+	from .context import context
+	from .expect import TestFailException
+
+	c = cls.color
+	if test.max_memory and stats.peak_bytes > test.max_memory:
+		msg = f"used \x1b[22m{c.received}{format_bytes(stats.peak_bytes)}\x1b[m at its peak, over the limit of \x1b[22m{c.expected}{format_bytes(test.max_memory)}"
+	elif test.max_retained and stats.retained_bytes > test.max_retained:
+		msg = f"kept \x1b[22m{c.received}{format_bytes(stats.retained_bytes)}\x1b[m after it ended, over the limit of \x1b[22m{c.expected}{format_bytes(test.max_retained)}"
+	else:
+		return
+
+	if stats.top_sites:
+		msg += "\x1b[m\n\nlargest allocations still held:\n" + "\n".join(
+			f"{site} ({format_bytes(size)})" for site, size in stats.top_sites
+		)
+
+	raise TestFailException(context.from_func(cls, test.func), msg)
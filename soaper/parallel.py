@@ -0,0 +1,136 @@
+from .soaper import TestOutcome, _failure_limit, _plan_tests, _run_test, _report_results
+
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from importlib import import_module
+import sys
+
+
+def _find_suite(module: str, qualname: str):
+	"""Find a suite class by name, importing its module if this process hasn't yet.
+
+	Importing the module registers its suites through `TestSuite.__init_subclass__`.
+	"""
+	if module not in sys.modules:
+		import_module(module)
+
+	suite = sys.modules[module]
+	for name in qualname.split("."):
+		suite = getattr(suite, name)
+
+	return suite
+
+
+def _run_job(job: tuple[str, str, int]) -> TestOutcome:
+	"""Run a single test inside a worker process.
+	"""
+	module, qualname, index = job
+	suite = _find_suite(module, qualname)
+	return _run_test(suite, suite.tests[index])
+
+
+def _run_jobs(jobs: list[tuple[str, str, int]]) -> list[TestOutcome]:
+	"""Run a chunk of tests inside a worker process.
+	"""
+	return [_run_job(job) for job in jobs]
+
+
+def plan_jobs(suites: list, order: str = None, only: str = None, selected: dict = None) -> list[tuple[type, list, dict, list]]:
+	"""Plan the given suites as `(suite, tests, done, jobs)`, where `jobs` are the tests that have to run as `(module, qualname, index)`.
+
+	If `selected` is given, only the test names it has for each suite are run.
+	"""
+	plans = []
+	for suite in suites:
+		tests, done = _plan_tests(suite, order, only, selected and selected[suite])
+		# a suite with nothing left to run after filtering isn't shown at all
+		if not tests and (only or selected):
+			continue
+
+		indices = {test.name: index for index, test in enumerate(suite.tests)}
+		jobs = [
+			(suite.__module__, suite.__qualname__, indices[test.name])
+			for test in tests
+			if test.name not in done
+		]
+		plans.append((suite, tests, done, jobs))
+
+	return plans
+
+
+def report_plans(plans: list, outcomes: list, reporter, limit: _failure_limit = None, cancel: callable = None) -> int:
+	"""Report planned suites in order, taking the outcomes of each suite's jobs from its own iterator in `outcomes`.
+
+	After each suite, `cancel(i)` is called to drop whatever is left of suite `i`'s jobs,
+	which is only anything when it stopped early because too many tests failed.
+	"""
+	num_fails = 0
+	for i, (suite, tests, done, _) in enumerate(plans):
+		reporter.start_suite(suite)
+		suite_outcomes = (done.get(test.name) or next(outcomes[i]) for test in tests)
+		suite_limit = _failure_limit.for_suite(suite, limit)
+		num_fails += _report_results(suite, suite_outcomes, reporter, suite_limit, len(tests)).fails
+
+		if cancel is not None:
+			cancel(i)
+
+	return num_fails
+
+
+def run_in_processes(
+	suites: list,
+	workers: int,
+	reporter,
+	order: str = None,
+	only: str = None,
+	selected: dict = None,
+	limit: _failure_limit = None,
+) -> int:
+	"""Run every test of the given suites on a pool of `workers` processes, and return the number of fails.
+
+	If `selected` is given, only the test names it has for each suite are run.
+	Results are printed in the same order as a sequential run, as soon as they are available.
+	"""
+	plans = plan_jobs(suites, order, only, selected)
+	chunk_size = max(1, sum(len(jobs) for *_, jobs in plans) // (workers * 4))
+	limit = limit or _failure_limit()
+
+	# chunks never mix suites, so a suite that stops early only cancels its own tests
+	chunks = iter([
+		(i, jobs[start:start + chunk_size])
+		for i, (*_, jobs) in enumerate(plans)
+		for start in range(0, len(jobs), chunk_size)
+	])
+	queued = deque()
+	cancelled = set()
+
+	with ProcessPoolExecutor(max_workers=workers) as pool:
+		def submit_more():
+			# only a few chunks are queued ahead, so few are wasted once too many tests failed
+			while len(queued) < 2 * workers and not limit.reached:
+				i, jobs = next(chunks, (None, None))
+				if jobs is None:
+					return
+				if i not in cancelled:
+					queued.append((i, pool.submit(_run_jobs, jobs)))
+
+		def suite_outcomes(i: int):
+			while True:
+				submit_more()
+				if not queued or queued[0][0] != i:
+					return
+				_, future = queued.popleft()
+				yield from future.result()
+
+		def cancel(i: int):
+			cancelled.add(i)
+			for j, future in list(queued):
+				if j == i:
+					future.cancel()
+					queued.remove((j, future))
+
+		try:
+			return report_plans(plans, [suite_outcomes(i) for i in range(len(plans))], reporter, limit, cancel)
+		finally:
+			pool.shutdown(cancel_futures=True)
@@ -0,0 +1,515 @@
+from .soaper import TestSuite, TestResult, TestOutcome, SuiteSummary
+from .memory import format_bytes
+
+
+from dataclasses import asdict
+from xml.sax.saxutils import escape, quoteattr
+import heapq
+import json
+import os
+import re
+import sys
+
+
+_ansi_codes = re.compile(r"\x1b\[[0-9;]*m")
+
+
+def _shorten_str(s: str, max_len: int):
+	if max_len == None or len(s) <= max_len:
+		return s
+	
+	return s[:max_len - len(s) - 4] + " ..."
+
+
+def _split_lines(s: str):
+	return [line.strip() for line in s.strip().split("\n")]
+
+
+def _format_duration(ns: int) -> str:
+	if ns < 1_000:
+		return f"{ns:.0f}ns"
+	if ns < 1_000_000:
+		return f"{ns / 1_000:.1f}\u00b5s"
+	if ns < 1_000_000_000:
+		return f"{ns / 1_000_000:.1f}ms"
+	return f"{ns / 1_000_000_000:.2f}s"
+
+
+class Reporter:
+	"""
+	Receives the structured events of a test run.
+
+	Extend this class and pass an instance to `run`/`run_all` to change how results are shown,
+	every method is optional:
+	```py
+	class MyReporter(Reporter):
+		def add_outcome(self, suite, outcome):
+			...
+	```
+	"""
+
+	def start_suite(self, suite: type):
+		"""Called before any test in `suite` runs.
+		"""
+
+	def add_outcome(self, suite: type, outcome: TestOutcome):
+		"""Called once for every test, in the order they're planned to run: sorted by name,
+		with the tests that failed last time moved to the front when the run is ordered failed-first.
+		"""
+
+	def end_suite(self, suite: type, summary: SuiteSummary):
+		"""Called after every test in `suite` has been reported.
+		"""
+
+	def close(self):
+		"""Called once the whole run is over.
+		"""
+
+
+class ConsoleReporter(Reporter):
+	"""
+	Prints results as a tree, the same way soaper always has.
+
+	Output is buffered and written in batches. It is flushed after every test when writing to a
+	terminal, and after every suite (or `buffer_size` characters) otherwise. Colors are turned off
+	when the stream is not a terminal or `NO_COLOR` is set, unless `color` says otherwise. In
+	`quiet` mode only the suites with failures are shown, followed by a one-line summary.
+	"""
+
+	def __init__(self, stream = None, color: bool = None, quiet: bool = False, buffer_size: int = 1 << 16):
+		self.stream = stream or sys.stdout
+		is_tty = hasattr(self.stream, "isatty") and self.stream.isatty()
+		self.color = color if color is not None else is_tty and "NO_COLOR" not in os.environ
+		self.quiet = quiet
+		self.buffer_size = 0 if is_tty else buffer_size
+
+		self._buffer = []
+		self._buffered = 0
+		self._total = SuiteSummary()
+		self._suites = 0
+		self._shown_summaries = 0
+		self._suite_header = ""
+		self._slowest = []
+		self._most_retained = []
+
+		c = TestSuite.color
+		if self.color:
+			self._badges = {
+				kind.name: (
+					"├─"
+					f"{kind.color}{c.result_prefix}"
+					f"{kind.color}\x1b[30m{kind.name}"
+					f"{kind.color}{c.result_suffix}\x1b[m "
+				)
+				for kind in (TestResult.Pass, TestResult.Fail, TestResult.Skip, TestResult.Cached)
+			}
+		else:
+			self._badges = {
+				kind.name: f"├─[{kind.name}] "
+				for kind in (TestResult.Pass, TestResult.Fail, TestResult.Skip, TestResult.Cached)
+			}
+
+	# output
+
+	def _write(self, s: str):
+		self._buffer.append(s)
+		self._buffered += len(s)
+		if self._buffered >= self.buffer_size:
+			self.flush()
+
+	def flush(self):
+		if not self._buffer:
+			return
+
+		text = "".join(self._buffer)
+		if not self.color:
+			text = _ansi_codes.sub("", text)
+
+		self.stream.write(text)
+		self.stream.flush()
+		self._buffer = []
+		self._buffered = 0
+
+	# events
+
+	def start_suite(self, suite: type):
+		self._suite_header = self._format_suite_name(suite)
+		self._slowest = []
+		self._most_retained = []
+
+		if not self.quiet:
+			self._write(self._suite_header)
+			self._suite_header = ""
+
+	def add_outcome(self, suite: type, outcome: TestOutcome):
+		cfg = suite.config
+
+		if cfg.slowest_tests > 0 and outcome.result in (TestResult.Pass, TestResult.Fail):
+			# a min-heap of the slowest tests so far, never more than `slowest_tests` long
+			entry = (outcome.duration_ns, outcome.test_name)
+			if len(self._slowest) < cfg.slowest_tests:
+				heapq.heappush(self._slowest, entry)
+			else:
+				heapq.heappushpop(self._slowest, entry)
+
+		if cfg.memory_worst_tests > 0 and outcome.memory is not None and outcome.memory.retained_bytes > 0:
+			# the same kind of heap, for the tests that held on to the most memory
+			entry = (outcome.memory.retained_bytes, outcome.test_name, outcome.memory.top_sites)
+			if len(self._most_retained) < cfg.memory_worst_tests:
+				heapq.heappush(self._most_retained, entry)
+			else:
+				heapq.heappushpop(self._most_retained, entry)
+
+		match outcome.result:
+			case TestResult.Pass | TestResult.Cached:
+				if cfg.show_passes and not self.quiet:
+					self._write(self._format_test_name(cfg, outcome))
+			case TestResult.Fail:
+				if cfg.show_fails or self.quiet:
+					self._write(self._suite_header)
+					self._suite_header = ""
+					self._write(self._format_fail(cfg, outcome))
+			case TestResult.Skip:
+				if cfg.show_skips and not self.quiet:
+					self._write(self._format_test_name(cfg, outcome))
+
+		if self.buffer_size == 0:
+			self.flush()
+
+	def end_suite(self, suite: type, summary: SuiteSummary):
+		self._total.merge(summary)
+		self._suites += 1
+
+		if not self.quiet or summary.fails > 0:
+			self._shown_summaries += 1
+			slowest = sorted(self._slowest, reverse=True)
+			most_retained = sorted(self._most_retained, reverse=True)
+			self._write(self._format_summary(summary, slowest, most_retained))
+
+		self._suite_header = ""
+		self.flush()
+
+	def close(self):
+		# the summary of a run with a single suite that was already shown would be the same one again
+		if self.quiet and not (self._suites == 1 and self._shown_summaries == 1):
+			self._write(self._format_summary(self._total))
+		self.flush()
+
+	# formatting
+
+	def _format_suite_name(self, suite: type) -> str:
+		if not suite.config.show_suites:
+			return ""
+
+		c = TestSuite.color
+		out = [
+			f"{c.suite_name}"
+			f"{c.result_prefix if self.color else '['}"
+			f"{c.suite_name}"
+			f"\x1b[30m{suite.__name__}"
+			f"{c.suite_name}"
+			f"{c.result_suffix if self.color else ']'}"
+			"\x1b[m\n"
+		]
+		if suite.config.show_suite_docstring and suite.__doc__:
+			docstring = " / ".join(_split_lines(suite.__doc__))
+			out.append(f"│ {c.context}└─\u2192 {docstring}\x1b[m\n")
+
+		out.append("│ \n")
+		return "".join(out)
+
+	def _format_test_name(self, cfg: any, outcome: TestOutcome) -> str:
+		"""Format the name of a given test.
+		"""
+		ctx = outcome.ctx
+		test_name = _shorten_str(outcome.test_name, cfg.max_test_name_len)
+		line = self._badges[outcome.result.name]
+
+		if cfg.show_timings:
+			ran = outcome.result in (TestResult.Pass, TestResult.Fail)
+			duration = _format_duration(outcome.duration_ns) if ran else ""
+			line += f"{TestSuite.color.duration}{duration:>7}\x1b[m "
+
+		line += test_name
+
+		if cfg.show_test_docstrings and len(ctx.docstring) > 0:
+			docstring = _shorten_str(ctx.docstring, cfg.max_docstring_len).strip()
+			docstring = " / ".join([line.strip() for line in docstring.split("\n")])
+			line += f"{TestSuite.color.docstring}\"{docstring}\"\x1b[m"
+
+		if outcome.benchmark is not None:
+			line += "\n" + self._format_benchmark(outcome.benchmark)
+		if outcome.memory is not None:
+			line += "\n" + self._format_memory(outcome.memory)
+
+		return line + "\n"
+
+	def _format_memory(self, stats) -> str:
+		return (
+			f"│ {TestSuite.color.context}"
+			f"peak {format_bytes(stats.peak_bytes)}  "
+			f"retained {format_bytes(stats.retained_bytes)}"
+			"\x1b[m"
+		)
+
+	def _format_benchmark(self, stats) -> str:
+		c = TestSuite.color
+		line = (
+			f"│ {c.context}"
+			f"min {_format_duration(stats.min_ns)}  "
+			f"median {_format_duration(stats.median_ns)}  "
+			f"p95 {_format_duration(stats.p95_ns)}  "
+			f"\u00b1 {_format_duration(stats.stddev_ns)}  "
+			f"{stats.ops_per_sec:,.0f} ops/s"
+		)
+		if stats.baseline_ns:
+			line += f"  (baseline {_format_duration(stats.baseline_ns)}, {stats.regression:+.1%})"
+		return line + "\x1b[m"
+
+	def _format_fail(self, cfg: any, outcome: TestOutcome) -> str:
+		c = TestSuite.color
+		ctx = outcome.ctx
+		msg = outcome.msg
+		out = [self._format_test_name(cfg, outcome)]
+
+		if cfg.show_fail_docstring and len(ctx.docstring) > 0:
+			docstring = "\n   ".join(_split_lines(ctx.docstring))
+			out.append(f"│ {c.context}└─\u2192 {docstring}\x1b[m\n")
+			out.append("│ \n")
+
+		if cfg.show_fail_context:
+			if cfg.tab_arrows:
+				tab_replacement = (
+					c.line_num
+					+ "\u2192"
+					+ c.context
+					+ " " * (cfg.tab_width - 1)
+				)
+			else:
+				tab_replacement = " " * cfg.tab_width
+			
+			# remove any blank lines at the end
+			lines = "\n".join(ctx.lines).rstrip().split("\n")
+
+			new_lines = []
+			prev_tab_level = 0
+			for l in lines:
+				if len(l.strip()) == 0:
+					new_lines.append(tab_replacement * prev_tab_level)
+				else:
+					prev_tab_level = len(l) - len(l.lstrip())
+					new_lines.append(l.replace("\t", tab_replacement))
+			
+			if cfg.show_context_line_nums:
+				for i, line in enumerate(new_lines):
+					line_num = ctx.first_line_num + i + 1
+					new_lines[i] = f"{c.line_num}{line_num: 3}|{c.context}{line}"
+
+			lines_str = f"\n\x1b[m│ {c.context}".join(new_lines)
+
+			out.append(f"│ {c.context}in file: ./{ctx.rel_name}:{ctx.line_num}\x1b[m\n")
+			out.append(f"│ {c.context}{lines_str}\x1b[m\n")
+			out.append("│ \n")
+
+		if cfg.show_fail_message and msg:
+			msg = f"\n\x1b[m│ {c.context}".join(msg.split("\n"))
+			out.append(f"\x1b[m│ {c.context}{msg}\x1b[m\n")
+			out.append("│ \n")
+
+		return "".join(out)
+
+	def _format_summary(self, summary: SuiteSummary, slowest: list[tuple[int, str]] = (), most_retained: list[tuple[int, str, list]] = ()) -> str:
+		c = TestSuite.color
+		num_passes = summary.passes
+		num_fails = summary.fails
+		num_skips = summary.skips
+		num_marked = summary.marked
+
+		passes_str = "passes" if num_passes != 1 else "pass"
+		fails_str = "fails" if num_fails != 1 else "fail"
+		skips_str = "tests skipped" if num_skips != 1 else "test skipped"
+
+		results = []
+
+		dim_fails = "\x1b[2m" if num_fails == 0 else ""
+
+		results.append(
+			f"{c.test_pass}\x1b[49m\u2713 {num_passes} {passes_str}\x1b[m  "
+			f"{dim_fails}{c.test_fail}\x1b[49m\u2717 {num_fails} {fails_str}\x1b[m"
+		)
+
+		if summary.cached > 0:
+			cached_str = "cached passes" if summary.cached != 1 else "cached pass"
+			results.append(
+				f"\x1b[2m{c.test_cached}\x1b[49m"
+				f"\u2713 {summary.cached} {cached_str}"
+				"\x1b[m"
+			)
+		if num_skips > 0:
+			results.append(
+				f"\x1b[2m{c.test_skip}\x1b[49m"
+				f"! {num_skips} {skips_str}"
+				"\x1b[m"
+			)
+		if num_marked > 0:
+			results.append(
+				f"\x1b[2m{c.test_skip}\x1b[49m"
+				f"! {num_marked} test marked as failing"
+				"\x1b[m"
+			)
+		if summary.not_run > 0:
+			not_run_str = "tests not run" if summary.not_run != 1 else "test not run"
+			results.append(
+				f"{c.test_fail}\x1b[49m"
+				f"! {summary.not_run} {not_run_str}"
+				"\x1b[m"
+			)
+		
+		if summary.setup_ns or summary.teardown_ns:
+			results.append(
+				f"{c.duration}"
+				f"setup {_format_duration(summary.setup_ns)}, "
+				f"teardown {_format_duration(summary.teardown_ns)}"
+				"\x1b[m"
+			)
+		if slowest:
+			tests = ", ".join(f"{name} ({_format_duration(ns)})" for ns, name in slowest)
+			results.append(f"{c.duration}slowest: {tests}\x1b[m")
+		for retained, name, sites in most_retained:
+			where = ", ".join(f"{site} ({format_bytes(size)})" for site, size in sites)
+			results.append(f"{c.duration}{name} retained {format_bytes(retained)}" + (f": {where}" if where else "") + "\x1b[m")
+		
+		if len(results) == 1:
+			tree = "╰─ " + results[0]
+		else:
+			tree = "├─ " + "\n├─ ".join(results[:-1]) + "\n╰─ " + results[-1]
+
+		return "│ \n" + tree + "\n\n"
+
+
+class MultiReporter(Reporter):
+	"""Sends every event to each of the given reporters, in order.
+	"""
+
+	def __init__(self, *reporters: Reporter):
+		self.reporters = reporters
+
+	def start_suite(self, suite: type):
+		for reporter in self.reporters:
+			reporter.start_suite(suite)
+
+	def add_outcome(self, suite: type, outcome: TestOutcome):
+		for reporter in self.reporters:
+			reporter.add_outcome(suite, outcome)
+
+	def end_suite(self, suite: type, summary: SuiteSummary):
+		for reporter in self.reporters:
+			reporter.end_suite(suite, summary)
+
+	def close(self):
+		for reporter in self.reporters:
+			reporter.close()
+
+
+# characters that can't appear in an XML document, even escaped
+_xml_invalid_chars = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _plain_text(s: str) -> str:
+	return _xml_invalid_chars.sub("", _ansi_codes.sub("", s or ""))
+
+
+def _outcome_record(suite: type, outcome: TestOutcome) -> dict:
+	"""Get the machine readable fields of an outcome.
+	"""
+	ctx = outcome.ctx
+	return {
+		"suite": f"{suite.__module__}.{suite.__qualname__}",
+		"test": outcome.test_name,
+		"outcome": outcome.result.name.lower(),
+		"marked": outcome.marked,
+		"duration": outcome.duration_ns / 1e9,
+		"message": _plain_text(outcome.msg),
+		"file": ctx.file_name,
+		"line": ctx.line_num,
+		"benchmark": asdict(outcome.benchmark) if outcome.benchmark is not None else None,
+		"timed_out": outcome.timed_out,
+		"memory": asdict(outcome.memory) if outcome.memory is not None else None,
+	}
+
+
+class JsonLinesReporter(Reporter):
+	"""
+	Writes one JSON object per test to `path`, as soon as the test finishes.
+
+	Each line has the `suite`, `test`, `outcome`, `marked`, `duration` (in seconds),
+	`message` (without colors), `file` and `line` of a test, whether it `timed_out`,
+	and its `memory` when that was measured.
+	"""
+
+	def __init__(self, path: str):
+		self.file = open(path, "w", encoding="utf-8")
+
+	def add_outcome(self, suite: type, outcome: TestOutcome):
+		self.file.write(json.dumps(_outcome_record(suite, outcome)) + "\n")
+		self.file.flush()
+
+	def close(self):
+		self.file.close()
+
+
+class JUnitReporter(Reporter):
+	"""
+	Writes a JUnit XML report to `path`, adding each test as soon as it finishes.
+
+	The closing tags are rewritten after every test, so the file is always a complete document,
+	even if the run crashes part way through.
+	"""
+
+	def __init__(self, path: str):
+		self.file = open(path, "wb")
+		self._write(b'<?xml version="1.0" encoding="UTF-8"?>\n<testsuites>\n', b"</testsuites>\n")
+
+	def _write(self, data: bytes, closing: bytes):
+		"""Append `data`, followed by the closing tags that the next write will replace.
+		"""
+		self.file.write(data)
+		end = self.file.tell()
+		self.file.write(closing)
+		self.file.flush()
+		self.file.seek(end)
+
+	def start_suite(self, suite: type):
+		name = quoteattr(f"{suite.__module__}.{suite.__qualname__}")
+		self._write(f"\t<testsuite name={name}>\n".encode(), b"\t</testsuite>\n</testsuites>\n")
+
+	def add_outcome(self, suite: type, outcome: TestOutcome):
+		record = _outcome_record(suite, outcome)
+		attrs = " ".join([
+			f"classname={quoteattr(record['suite'])}",
+			f"name={quoteattr(record['test'])}",
+			f"time=\"{record['duration']:.6f}\"",
+			f"file={quoteattr(record['file'])}",
+			f"line=\"{record['line']}\"",
+		])
+
+		match outcome.result:
+			case TestResult.Fail:
+				message = record["message"]
+				summary = message.strip().split("\n")[0]
+				kind = ' type="timeout"' if outcome.timed_out else ""
+				body = f"\n\t\t\t<failure message={quoteattr(summary)}{kind}>{escape(message)}</failure>\n\t\t"
+			case TestResult.Skip:
+				body = "<skipped/>"
+			case _:
+				body = ""
+
+		testcase = f"\t\t<testcase {attrs}>{body}</testcase>\n"
+		self._write(testcase.encode(), b"\t</testsuite>\n</testsuites>\n")
+
+	def end_suite(self, suite: type, summary: SuiteSummary):
+		self._write(b"\t</testsuite>\n", b"</testsuites>\n")
+
+	def close(self):
+		self.file.seek(0, os.SEEK_END)
+		self.file.close()
@@ -0,0 +1,96 @@
+from .soaper import _test_key
+from . import cache
+
+
+import heapq
+import json
+import zlib
+
+
+# how long each test took in this run, in seconds, by `_test_key`, until `save` adds them to the cache
+_recorded = {}
+
+
+def load_durations(paths: list[str]) -> dict[str, float]:
+	"""Read and merge durations files, like the `.soaper_cache/durations.json` of each shard of a previous run.
+
+	Files that are missing or unreadable are skipped, so a first run without any still works.
+	"""
+	durations = {}
+	for path in paths:
+		try:
+			with open(path, "r") as f:
+				data = json.load(f)
+		except (OSError, ValueError):
+			continue
+		if isinstance(data, dict):
+			durations.update(data.get("durations", {}))
+	return durations
+
+
+def record(cls: any, test_name: str, duration_ns: int):
+	_recorded[_test_key(cls, test_name)] = duration_ns / 1e9
+
+
+def save():
+	"""Add the durations recorded so far to the cache, which is only done once at the end of `run_all`.
+	"""
+	if _recorded:
+		# tests this run didn't touch, like ones on other shards, keep their old durations
+		durations = cache.load("durations").get("durations", {})
+		durations.update(_recorded)
+		cache.save("durations", {"durations": durations})
+		_recorded.clear()
+
+
+def _by_hash(keys: list[str], total: int) -> list[int]:
+	# crc32 is the same in every process, unlike `hash`, so every shard agrees
+	return [zlib.crc32(key.encode()) % total for key in keys]
+
+
+def _by_duration(keys: list[str], total: int, durations: dict[str, float]) -> list[int]:
+	"""Assign the longest tests first, each to the shard with the least work so far.
+	"""
+	known = sorted(durations[key] for key in keys if key in durations)
+	# a new test is guessed to take as long as a typical one
+	guess = known[len(known) // 2] if known else 0.0
+
+	order = sorted(range(len(keys)), key=lambda i: (-durations.get(keys[i], guess), keys[i]))
+	loads = [(0.0, shard) for shard in range(total)]
+	shards = [0] * len(keys)
+
+	for i in order:
+		load, shard = heapq.heappop(loads)
+		shards[i] = shard
+		heapq.heappush(loads, (load + durations.get(keys[i], guess), shard))
+
+	return shards
+
+
+def select(suites: list, shard: int, total: int, durations: str | list[str] = None) -> dict[type, set[str]]:
+	"""Pick the tests of the given suites that belong to `shard` out of `total`, by suite.
+
+	Every shard makes the same split as long as it sees the same tests and durations.
+	The split is balanced by the durations in the given files when there are any,
+	and made by hashing the names of the tests otherwise. The run's own cache is never used,
+	since other shards may be writing to it.
+	"""
+	if total < 1 or not 0 <= shard < total:
+		raise Exception(f"Invalid shard {shard} of {total}, shards are numbered from 0 to {total - 1}")
+
+	tests = [(suite, test.name) for suite in suites for test in suite.tests]
+	keys = [_test_key(suite, name) for suite, name in tests]
+
+	if isinstance(durations, str):
+		durations = [durations]
+	durations = load_durations(durations or [])
+	if any(key in durations for key in keys):
+		shards = _by_duration(keys, total, durations)
+	else:
+		shards = _by_hash(keys, total)
+
+	selected = {}
+	for (suite, name), test_shard in zip(tests, shards):
+		if test_shard == shard:
+			selected.setdefault(suite, set()).add(name)
+	return selected
@@ -1,10 +1,18 @@
-from .expect import TestFailException
+from .expect import TestFailException, _register_frame_func, _unregister_frame_funcs, _position_at
 from .context import context
-from .decorator import TestDecorator
+from .decorator import TestDecorator, FixtureDecorator
+from . import fixtures
 
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
+from inspect import isfunction
+from multiprocessing import current_process
 from dataclasses import dataclass
+from time import perf_counter_ns
+import asyncio
+import threading
 
 
 class TestSuite:
@@ -34,6 +42,8 @@ class TestSuite:
 	"""
 
 	suites = []
+	tests = ()
+	fixtures = {}
 	is_done = False
 
 	class color:
@@ -45,12 +55,14 @@ class TestSuite:
 		test_pass = "\x1b[42m\x1b[32m"
 		test_fail = "\x1b[41m\x1b[31m"
 		test_skip = "\x1b[43m\x1b[33m"
+		test_cached = "\x1b[46m\x1b[36m"
 		context = "\x1b[39m\x1b[2m" # "\x1b[90m"
 		docstring = "\x1b[39m\x1b[2m" # "\x1b[90m"
 		suite_name = "\x1b[1m\x1b[47m\x1b[37m"
 		expected = "\x1b[32m"
 		received = "\x1b[31m"
 		line_num = "\x1b[90m"
+		duration = "\x1b[90m"
 
 		# round 
 		result_prefix = "\x1b[49m\uE0B6"
@@ -74,6 +86,10 @@ class TestSuite:
 		"""
 
 		autorun_tests = False
+		threads = 0
+		async_concurrency = 0
+		fail_fast = False
+		max_failures = 0
 
 		show_suites = True
 		show_suite_docstring = True
@@ -82,6 +98,29 @@ class TestSuite:
 		max_docstring_len = 70
 		max_test_name_len = 40
 
+		show_timings = False
+		slowest_tests = 0
+
+		benchmark_samples = 20
+		benchmark_warmup = 2
+		benchmark_sample_time = 0.01
+		benchmark_max_regression = 0.2
+
+		incremental = False
+
+		timeout = 0.0
+		isolate_timeouts = False
+
+		trace_memory = False
+		memory_top_sites = 3
+		memory_worst_tests = 3
+
+		array_diff_items = 10
+		diff_context_lines = 3
+		max_diff_lines = 40
+		max_diff_time = 0.5
+		max_diffs = 20
+
 		show_passes = True
 		show_skips = True
 
@@ -101,25 +140,91 @@ class TestSuite:
 		cls.is_done = False
 		
 		TestSuite.suites.append(cls)
+		cls.tests, cls.fixtures = _build_manifest(cls)
 
 		cls.run = partial(_run_test_suite, cls)
 		
-		if cls.config.autorun_tests:
+		# suites are re-registered when a worker process imports their module
+		if cls.config.autorun_tests and current_process().name == "MainProcess":
 			cls.run()
 
 	@classmethod
-	def run(cls, target):
-		"""Run the given test suite.
+	def remove(cls, target):
+		"""Remove the given test suite from the loaded suites.
+		"""
+
+		if target in TestSuite.suites:
+			TestSuite.suites.remove(target)
+		_unregister_frame_funcs(target)
+
+	@classmethod
+	def run(cls, target, **kwargs) -> int:
+		"""Run the given test suite, and return the number of fails.
 		"""
 
-		target.run()
+		return target.run(**kwargs)
 
 	@classmethod
-	def run_all(cls):
-		"""Run all currently loaded test suites.
+	def run_all(
+		cls,
+		workers: int = 0,
+		threads: int = 0,
+		suites: list = None,
+		reporter = None,
+		order: str = None,
+		only: str = None,
+		shard: int = None,
+		total: int = None,
+		durations: str | list[str] = None,
+		serve: str = None,
+		fail_fast: bool = False,
+		max_failures: int = 0,
+	) -> int:
+		"""Run all currently loaded test suites, or only the given ones, and return the number of fails.
+
+		If `workers` is more than 1, the tests are run on a pool of that many processes.
+		If `threads` is more than 1, each suite's tests are run on a pool of that many threads.
+		Results go to `reporter`, a `ConsoleReporter` by default.
+		`order="failed-first"` runs the tests that failed last time first,
+		and `only="last-failed"` runs only those tests.
+		With `shard` and `total`, only the tests of shard number `shard` (from 0) out of `total` are run,
+		balanced by the durations in the `durations` file (or list of files) when there are any.
+		If `serve` is a `host:port` address, the tests are handed out to workers that connect to it instead.
+		With `fail_fast`, or once `max_failures` tests have failed, no more tests are started.
 		"""
 
-		[t.run() for t in cls.suites]
+		suites = cls.suites if suites is None else suites
+		reporter = reporter or _default_reporter()
+		limit = _failure_limit(1 if fail_fast else max_failures)
+
+		selected = None
+		if shard is not None or total is not None:
+			from . import sharding
+			selected = sharding.select(suites, shard or 0, total or 1, durations)
+			suites = [suite for suite in suites if suite in selected]
+
+		try:
+			if serve:
+				from .distributed import serve_tests
+				num_fails = serve_tests(suites, serve, reporter, order=order, only=only, selected=selected, limit=limit)
+			elif workers > 1:
+				from .parallel import run_in_processes
+				num_fails = run_in_processes(suites, workers, reporter, order=order, only=only, selected=selected, limit=limit)
+			else:
+				num_fails = sum(
+					t.run(threads, reporter, order=order, only=only, names=selected and selected[t], limit=limit)
+					for t in suites
+				)
+		finally:
+			# session fixtures are shared by every suite in the run
+			num_session_fails = fixtures.end_session()
+			# durations are written once per run, since the file holds every test ever run
+			from . import sharding
+			sharding.save()
+
+		reporter.close()
+		num_fails += num_session_fails
+		return num_fails
 
 
 @dataclass
@@ -141,6 +246,10 @@ class TestResult:
 		name="Skip",
 		color=TestSuite.color.test_skip
 	)
+	Cached = TestResultKind(
+		name="Cached",
+		color=TestSuite.color.test_cached
+	)
 
 
 def _verify_config(cls):
@@ -156,6 +265,9 @@ def _verify_config(cls):
 		
 		cls_attr = getattr(cls.config, key)
 		this_attr = getattr(TestSuite.config, key)
+		# whole numbers are fine where a float is expected
+		if isinstance(this_attr, float) and type(cls_attr) is int:
+			continue
 		if not isinstance(cls_attr, type(this_attr)):
 			raise Exception(f"Invalid type for config key \"{key}\"")
 
@@ -173,121 +285,235 @@ def _default_config(cls):
 			setattr(cls.config, key, value)
 
 
-def _shorten_str(s: str, max_len: int):
-	if max_len == None or len(s) <= max_len:
-		return s
-	
-	return s[:max_len - len(s) - 4] + " ..."
+def _build_manifest(cls) -> tuple[tuple["TestInfo", ...], dict[str, fixtures.FixtureInfo]]:
+	"""Find every test and fixture on `cls`, and index the code objects of its functions so failures can find their suite quickly.
+	"""
 
+	tests = []
+	suite_fixtures = {}
 
-def _split_lines(s: str):
-	return [line.strip() for line in s.strip().split("\n")]
+	for key in dir(cls):
+		if key.startswith("_"):
+			continue
 
+		attr = getattr(cls, key, None)
+		if not isfunction(attr):
+			continue
 
-def _show_test_name(cfg: any, ctx: context, kind):
-	"""Print the formatted name of a given test.
+		_register_frame_func(cls, attr)
+
+		scope = getattr(attr, FixtureDecorator.FIXTURE, None)
+		if scope is not None:
+			suite_fixtures[key] = fixtures.FixtureInfo(key, attr, scope, fixtures.params_of(attr))
+		elif getattr(attr, TestDecorator.TEST, False):
+			tests.append(TestInfo(
+				name=attr.__name__,
+				func=attr,
+				skip=getattr(attr, TestDecorator.SKIP, False),
+				failing=getattr(attr, TestDecorator.FAILING, False),
+				is_async=getattr(attr, TestDecorator.ASYNC, False),
+				benchmark=getattr(attr, TestDecorator.BENCHMARK, False),
+				line_num=attr.__code__.co_firstlineno,
+				fixtures=fixtures.params_of(attr),
+				timeout=getattr(attr, TestDecorator.TIMEOUT, 0.0),
+				max_memory=getattr(attr, TestDecorator.MAX_MEMORY, 0),
+				max_retained=getattr(attr, TestDecorator.MAX_RETAINED, 0),
+			))
+
+	fixtures.check_fixtures(cls, tests, suite_fixtures)
+	return tuple(tests), suite_fixtures
+
+
+@dataclass(frozen=True, slots=True)
+class TestInfo:
+	"""A test found on a suite when the suite was created.
 	"""
-	test_name = _shorten_str(ctx.func_name, cfg.max_test_name_len)
-
-	print(
-		"├─"
-		f"{kind.color}{TestSuite.color.result_prefix}"
-		f"{kind.color}\x1b[30m{kind.name}"
-		f"{kind.color}{TestSuite.color.result_suffix}\x1b[m "
-		f"{test_name}",
-		end=""
-	)
 
-	if not cfg.show_test_docstrings or len(ctx.docstring) == 0:
-		print()
-		return
+	name: str
+	func: callable
+	skip: bool
+	failing: bool
+	is_async: bool
+	benchmark: bool
+	line_num: int
+	# the fixtures it takes, by parameter name
+	fixtures: tuple[str, ...] = ()
+	timeout: float = 0.0
+	# in bytes, 0 for no limit
+	max_memory: int = 0
+	max_retained: int = 0
+
+
+def _test_key(cls: any, test_name: str) -> str:
+	"""Name a test the same way in every cache file, as `module.Suite.test`.
+	"""
+	return f"{cls.__module__}.{cls.__qualname__}.{test_name}"
 
-	docstring = _shorten_str(ctx.docstring, cfg.max_docstring_len).strip()
-	docstring = " / ".join([line.strip() for line in docstring.split("\n")])
-	print(f"{TestSuite.color.docstring}\"{docstring}\"\x1b[m")
 
+class _failure_limit:
+	"""Counts the fails of a suite or a whole run, so no more tests are started after `max_failures` (0 for no limit).
 
-def _skip_test(cfg: any, ctx: context):
-	_show_test_name(cfg, ctx, TestResult.Skip)
+	A suite's limit also counts towards the limit of the run it's part of.
+	"""
 
+	def __init__(self, max_failures: int = 0, parent: "_failure_limit" = None):
+		self.max_failures = max_failures
+		self.parent = parent
+		self.fails = 0
 
-def _pass_test(cfg: any, ctx: context):
-	_show_test_name(cfg, ctx, TestResult.Pass)
+	@classmethod
+	def for_suite(cls, suite: any, parent: "_failure_limit" = None) -> "_failure_limit":
+		return cls(1 if suite.config.fail_fast else suite.config.max_failures, parent)
+
+	def add(self, outcome: "TestOutcome"):
+		if outcome.result == TestResult.Fail:
+			self.fails += 1
+			if self.parent is not None:
+				self.parent.add(outcome)
+
+	@property
+	def reached(self) -> bool:
+		if self.max_failures > 0 and self.fails >= self.max_failures:
+			return True
+		return self.parent is not None and self.parent.reached
+
+	def remaining(self) -> int:
+		"""How many more tests can fail before this limit or one above it is reached, 0 if there's no limit.
+		"""
+		limit = self
+		left = []
+		while limit is not None:
+			if limit.max_failures > 0:
+				left.append(limit.max_failures - limit.fails)
+			limit = limit.parent
+		return min(left, default=0)
 
 
-def _fail_test(cfg: any, ctx: context, msg: str):
-	_show_test_name(cfg, ctx, TestResult.Fail)
+# one event loop per thread, shared by every async test run on it
+_event_loops = threading.local()
 
-	if cfg.show_fail_docstring and len(ctx.docstring) > 0:
-		docstring = "\n   ".join(_split_lines(ctx.docstring))
-		print(f"│ {TestSuite.color.context}└─\u2192 {docstring}\x1b[m")
-		print("│ ")
 
-	if cfg.show_fail_context:
-		if cfg.tab_arrows:
-			tab_replacement = (
-				TestSuite.color.line_num
-				+ "\u2192"
-				+ TestSuite.color.context
-				+ " " * (cfg.tab_width - 1)
-			)
-		else:
-			tab_replacement = " " * cfg.tab_width
-		
-		# remove any blank lines at the end
-		lines = "\n".join(ctx.lines).rstrip().split("\n")
-
-		new_lines = []
-		prev_tab_level = 0
-		for l in lines:
-			if len(l.strip()) == 0:
-				new_lines.append(tab_replacement * prev_tab_level)
-			else:
-				prev_tab_level = len(l) - len(l.lstrip())
-				new_lines.append(l.replace("\t", tab_replacement))
-		
-		if cfg.show_context_line_nums:
-			for i, line in enumerate(new_lines):
-				line_num = ctx.first_line_num + i + 1
-				new_lines[i] = f"{TestSuite.color.line_num}{line_num: 3}|{TestSuite.color.context}{line}"
+@dataclass
+class SuiteSummary:
+	"""How many tests of a suite (or a whole run) ended each way.
+	"""
 
-		lines_str = f"\n\x1b[m│ {TestSuite.color.context}".join(new_lines)
+	passes: int = 0
+	fails: int = 0
+	skips: int = 0
+	cached: int = 0
+	marked: int = 0
+	# tests left out once too many others failed
+	not_run: int = 0
+	# time spent on suite-level work outside of the tests themselves
+	setup_ns: int = 0
+	teardown_ns: int = 0
+
+	def add(self, outcome: "TestOutcome"):
+		if outcome.marked:
+			self.marked += 1
+
+		match outcome.result:
+			case TestResult.Pass:
+				self.passes += 1
+			case TestResult.Fail:
+				self.fails += 1
+			case TestResult.Skip:
+				self.skips += 1
+			case TestResult.Cached:
+				self.cached += 1
 
-		print(f"│ {TestSuite.color.context}in file: ./{ctx.rel_name}:{ctx.line_num}\x1b[m")
-		print(f"│ {TestSuite.color.context}{lines_str}\x1b[m")
-		print("│ ")
+	def merge(self, other: "SuiteSummary"):
+		self.passes += other.passes
+		self.fails += other.fails
+		self.skips += other.skips
+		self.cached += other.cached
+		self.marked += other.marked
+		self.not_run += other.not_run
+		self.setup_ns += other.setup_ns
+		self.teardown_ns += other.teardown_ns
 
-	if cfg.show_fail_message and msg:
-		msg = f"\n\x1b[m│ {TestSuite.color.context}".join(msg.split("\n"))
-		print(f"\x1b[m│ {TestSuite.color.context}{msg}\x1b[m")
-		print("│ ")
 
+@dataclass
+class TestOutcome:
+	"""The structured result of running a single test.
+	"""
 
-def _run_test(cls: any, test: callable) -> tuple[TestResultKind, bool]:
-	ctx = context.from_func(cls, test)
-	msg = ""
-	passed = False
+	suite_name: str
+	test_name: str
+	result: TestResultKind
+	marked: bool
+	ctx: context
+	msg: str = ""
+	duration_ns: int = 0
+	# set for tests marked with `@test.benchmark`
+	benchmark: any = None
+	timed_out: bool = False
+	# set when memory is traced, or the test has memory limits
+	memory: any = None
+
+
+def _get_event_loop() -> asyncio.AbstractEventLoop:
+	"""Get the event loop shared by the async tests run on this thread.
+	"""
+	loop = getattr(_event_loops, "loop", None)
+	if loop is None or loop.is_closed():
+		loop = _event_loops.loop = asyncio.new_event_loop()
 
-	# if marked as skip, then skip
-	if getattr(test, TestDecorator.SKIP, False):
-		if cls.config.show_skips:
-			_skip_test(cls.config, ctx)
-		return TestResult.Skip, False
+	return loop
 
-	# run the test
+
+# the coroutine each thread is running, so the watchdog can show where a hung async test is waiting
+_running_coroutines = {}
+
+
+def _run_coroutine(coro):
+	"""Run a coroutine to completion on this thread's event loop.
+	"""
+	thread_id = threading.get_ident()
+	_running_coroutines[thread_id] = coro
 	try:
-		test()
-		passed = True
-	except TestFailException as test_fail:
-		ctx = test_fail.ctx
-		msg = test_fail.msg
-	except BaseException as err:
-		traceback = err.__traceback__.tb_next
+		return _get_event_loop().run_until_complete(coro)
+	finally:
+		del _running_coroutines[thread_id]
 
-		positions = list(traceback.tb_frame.f_code.co_positions())
-		underline = positions[traceback.tb_lasti // 2]
 
-		ctx = context.from_func(cls, test, traceback.tb_lineno, underline)
+def _close_event_loop():
+	"""Close this thread's event loop, if it made one.
+	"""
+	loop = getattr(_event_loops, "loop", None)
+	if loop is not None and not loop.is_closed():
+		loop.close()
+
+
+def _find_test_traceback(err: BaseException, test: TestInfo):
+	"""Find the traceback entry for the test's own frame.
+	"""
+	traceback = err.__traceback__
+	while traceback is not None:
+		if traceback.tb_frame.f_code is test.func.__code__:
+			return traceback
+		traceback = traceback.tb_next
+
+	return err.__traceback__.tb_next or err.__traceback__
+
+
+def _finish_test(cls: any, test: TestInfo, err: BaseException = None, duration_ns: int = 0) -> TestOutcome:
+	"""Turn whatever a test raised into its outcome.
+	"""
+	ctx = context.from_func(cls, test.func)
+	msg = ""
+	passed = err is None
+
+	if isinstance(err, TestFailException):
+		ctx = err.ctx
+		msg = err.msg
+	elif err is not None:
+		traceback = _find_test_traceback(err, test)
+
+		underline = _position_at(traceback.tb_frame.f_code, traceback.tb_lasti)
+
+		ctx = context.from_func(cls, test.func, traceback.tb_lineno, underline)
 		err_name = err.__class__.__name__
 		if not err.args:
 			msg = f"threw \x1b[22m{TestSuite.color.received}{err_name}"
@@ -297,97 +523,307 @@ def _run_test(cls: any, test: callable) -> tuple[TestResultKind, bool]:
 			msg = f"threw \x1b[22m{TestSuite.color.received}{err_name}: {err.args[0]}"
 
 	# if marked as failing
-	marked = getattr(test, TestDecorator.FAILING, False)
-	if marked:
+	if test.failing:
 		passed = not passed
 
-	if passed:
-		if cls.config.show_passes:
-			_pass_test(cls.config, ctx)
-		
-		return TestResult.Pass, marked
-	else:
-		if cls.config.show_fails:
-			_fail_test(cls.config, ctx, msg)
-		
-		return TestResult.Fail, marked
-
-
-def _run_test_suite(cls: any):
-	if cls.config.show_suites:
-		print(
-			f"{TestSuite.color.suite_name}"
-			f"{TestSuite.color.result_prefix}"
-			f"{TestSuite.color.suite_name}"
-			f"\x1b[30m{cls.__name__}"
-			f"{TestSuite.color.suite_name}"
-			f"{TestSuite.color.result_suffix}"
-			"\x1b[m"
-		)
-		if cls.config.show_suite_docstring and cls.__doc__:
-			docstring = " / ".join(_split_lines(cls.__doc__))
-			print(f"│ {TestSuite.color.context}└─\u2192 {docstring}\x1b[m")
+	result = TestResult.Pass if passed else TestResult.Fail
+	return TestOutcome(cls.__name__, test.name, result, test.failing, ctx, msg, duration_ns)
 
-		print("│ ")
 
-	num_passes = 0
-	num_fails = 0
-	num_skips = 0
-	num_marked = 0
+def _skip_outcome(cls: any, test: TestInfo) -> TestOutcome:
+	return TestOutcome(cls.__name__, test.name, TestResult.Skip, False, context.from_func(cls, test.func))
 
-	# get all attributes of cls that do not start with an underscore
-	attrs = [getattr(cls, key) for key in dir(cls) if not key.startswith("_")]
-	# filter the attributes to only include functions that have the TEST attribute
-	tests = [a for a in attrs if callable(a) and getattr(a, TestDecorator.TEST, False)]
 
-	for test in tests:
-		result, marked = _run_test(cls, test)
+def _run_test(cls: any, test: TestInfo) -> TestOutcome:
+	"""Run a single test without printing anything.
+	"""
 
-		if marked:
-			num_marked += 1
-		
-		match result:
-			case TestResult.Pass:
-				num_passes += 1
-			case TestResult.Fail:
-				num_fails += 1
-			case TestResult.Skip:
-				num_skips += 1
+	# if marked as skip, then skip
+	if test.skip:
+		return _skip_outcome(cls, test)
 
-	cls.is_done = True
+	timeout = test.timeout or cls.config.timeout
+	if timeout > 0:
+		from . import watchdog
+		if cls.config.isolate_timeouts:
+			return watchdog.run_isolated(cls, test, timeout, _run_test_body)
+		return watchdog.run_in_thread(cls, test, timeout, _run_test_body)
 
-	passes_str = "passes" if num_passes != 1 else "pass"
-	fails_str = "fails" if num_fails != 1 else "fail"
-	skips_str = "tests skipped" if num_skips != 1 else "test skipped"
+	return _run_test_body(cls, test)
 
-	results = []
 
-	dim_fails = "\x1b[2m" if num_fails == 0 else ""
-	passes_check = "\u2713 " if num_fails == 0 else ""
+def _run_test_body(cls: any, test: TestInfo) -> TestOutcome:
+	# run the test
+	failure = None
+	stats = None
+	memory_stats = None
+	test_scope = fixtures.scope() if test.fixtures else None
+	start = perf_counter_ns()
+	try:
+		args = fixtures.resolve(cls, test.fixtures, test_scope) if test.fixtures else {}
 
-	results.append(
-		f"{TestSuite.color.test_pass}\x1b[49m\u2713 {num_passes} {passes_str}\x1b[m  "
-		f"{dim_fails}{TestSuite.color.test_fail}\x1b[49m\u2717 {num_fails} {fails_str}\x1b[m"
-	)
+		if test.is_async:
+			call = lambda: _run_coroutine(test.func(**args))
+		else:
+			call = partial(test.func, **args) if args else test.func
+
+		if test.benchmark:
+			from . import benchmark
+			stats = benchmark.measure(cls, test.name, call)
+			benchmark.check_regression(cls, test.func, stats)
+		elif cls.config.trace_memory or test.max_memory or test.max_retained:
+			from . import memory
+			memory_stats = memory.measure(call, cls.config.memory_top_sites)
+			memory.check_limits(cls, test, memory_stats)
+		else:
+			call()
+	except BaseException as err:
+		failure = err
 
-	if num_skips > 0:
-		results.append(
-			f"\x1b[2m{TestSuite.color.test_skip}\x1b[49m"
-			f"! {num_skips} {skips_str}"
-			"\x1b[m"
-		)
-	if num_marked > 0:
-		results.append(
-			f"\x1b[2m{TestSuite.color.test_skip}\x1b[49m"
-			f"! {num_marked} test marked as failing"
-			"\x1b[m"
+	if test_scope is not None:
+		failure = _teardown_test(cls, test_scope, failure)
+
+	outcome = _finish_test(cls, test, failure, perf_counter_ns() - start)
+	outcome.benchmark = stats
+	outcome.memory = memory_stats
+	return outcome
+
+
+def _teardown_test(cls: any, test_scope: "fixtures.scope", failure: BaseException) -> BaseException:
+	"""Tear down a test's own fixtures, and return what the test should fail with, if anything.
+	"""
+	teardown_failures = test_scope.teardown(cls)
+	if failure is None and teardown_failures:
+		return teardown_failures[0]
+	return failure
+
+
+async def _run_test_async(cls: any, test: TestInfo, semaphore: asyncio.Semaphore, limit: _failure_limit) -> TestOutcome:
+	"""Run a single async test once the semaphore allows it, or return None if `limit` was reached by then.
+	"""
+
+	if test.skip:
+		return _skip_outcome(cls, test)
+
+	async with semaphore:
+		if limit.reached:
+			return None
+
+		failure = None
+		test_scope = fixtures.scope() if test.fixtures else None
+		start = perf_counter_ns()
+		timeout = test.timeout or cls.config.timeout
+		try:
+			args = fixtures.resolve(cls, test.fixtures, test_scope) if test.fixtures else {}
+			coro = test.func(**args)
+			if timeout > 0:
+				task = asyncio.ensure_future(coro)
+				done, _ = await asyncio.wait([task], timeout=timeout)
+				if not done:
+					# the stack has to be read before cancelling unwinds it
+					from . import watchdog
+					outcome = watchdog.timeout_outcome_for_coroutine(cls, test, timeout, coro)
+					task.cancel()
+					return outcome
+				task.result()
+			else:
+				await coro
+		except BaseException as err:
+			failure = err
+
+		if test_scope is not None:
+			failure = _teardown_test(cls, test_scope, failure)
+		duration_ns = perf_counter_ns() - start
+
+	outcome = _finish_test(cls, test, failure, duration_ns)
+	limit.add(outcome)
+	return outcome
+
+
+def _run_async_tests(cls: any, tests: list[TestInfo], concurrency: int, max_failures: int = 0) -> dict[str, TestOutcome]:
+	"""Run the given async tests, with at most `concurrency` running at once.
+
+	Once `max_failures` of them have failed, the ones that haven't started yet get an outcome of None.
+	"""
+	# these run before anything is reported, so they count their own fails
+	limit = _failure_limit(max_failures)
+
+	async def run_all():
+		semaphore = asyncio.Semaphore(concurrency)
+		return await asyncio.gather(*[_run_test_async(cls, test, semaphore, limit) for test in tests])
+
+	outcomes = _get_event_loop().run_until_complete(run_all())
+	return {test.name: outcome for test, outcome in zip(tests, outcomes)}
+
+
+_orders = (None, "failed-first")
+_onlys = (None, "last-failed")
+
+
+def _plan_tests(cls: any, order: str = None, only: str = None, names: set[str] = None) -> tuple[list[TestInfo], dict[str, TestOutcome]]:
+	"""Decide which of the suite's tests to report, in order, and which already have an outcome without running.
+
+	If `names` is given, only the tests with those names are considered at all.
+	"""
+	if order not in _orders:
+		raise Exception(f"Invalid test order \"{order}\"")
+	if only not in _onlys:
+		raise Exception(f"Invalid test selection \"{only}\"")
+
+	tests = list(cls.tests) if names is None else [test for test in cls.tests if test.name in names]
+	done = {}
+
+	if order == "failed-first" or only == "last-failed":
+		from . import history
+
+		# with no recorded failures, everything runs
+		if only == "last-failed" and history.has_failures():
+			tests = [test for test in tests if history.last_failed(cls, test.name)]
+		elif order == "failed-first":
+			# `sorted` is stable, so both groups keep their usual order
+			tests.sort(key=lambda test: not history.last_failed(cls, test.name))
+
+	if cls.config.incremental:
+		from . import incremental
+		for test in tests:
+			if not test.skip and incremental.is_cached_pass(cls, test):
+				done[test.name] = TestOutcome(
+					cls.__name__, test.name, TestResult.Cached, test.failing, context.from_func(cls, test.func)
+				)
+
+	return tests, done
+
+
+def _default_reporter():
+	from .reporter import ConsoleReporter
+	return ConsoleReporter()
+
+
+_no_more = object()
+
+
+def _report_results(cls: any, outcomes, reporter, limit: _failure_limit = None, planned: int = 0) -> SuiteSummary:
+	"""Pass each outcome to the reporter as it arrives, then end the suite.
+
+	Once `limit` is reached no more outcomes are taken, and the rest of the `planned` tests are counted as not run.
+	"""
+	from . import history, sharding
+	summary = SuiteSummary()
+	limit = limit or _failure_limit()
+
+	tests = {test.name: test for test in cls.tests}
+	reported = 0
+
+	outcomes = iter(outcomes)
+	while not limit.reached:
+		outcome = next(outcomes, _no_more)
+		if outcome is _no_more:
+			break
+
+		reported += 1
+		# an async test that wasn't started because too many others failed
+		if outcome is None:
+			summary.not_run += 1
+			continue
+
+		limit.add(outcome)
+		summary.add(outcome)
+		reporter.add_outcome(cls, outcome)
+
+		if outcome.benchmark is not None:
+			from . import benchmark
+			benchmark.record(cls, outcome.test_name, outcome.benchmark, outcome.result == TestResult.Pass)
+
+		if outcome.result in (TestResult.Pass, TestResult.Fail):
+			history.record(cls, outcome.test_name, outcome.result == TestResult.Fail)
+			sharding.record(cls, outcome.test_name, outcome.duration_ns)
+
+			if cls.config.incremental:
+				from . import incremental
+				incremental.record(cls, tests[outcome.test_name], outcome.result == TestResult.Pass)
+
+	# the suite's fixtures are torn down once all of its tests are done
+	suite_scope, teardown_failures = fixtures.end_suite(cls)
+	if suite_scope is not None:
+		summary.setup_ns += suite_scope.setup_ns
+		summary.teardown_ns += suite_scope.teardown_ns
+
+	for failure in teardown_failures:
+		outcome = TestOutcome(
+			cls.__name__, f"{failure.ctx.func_name} (teardown)", TestResult.Fail, False, failure.ctx, failure.msg
 		)
-	
-	print("│ ")
-	if len(results) == 1:
-		print("╰─ " + results[0])
+		limit.add(outcome)
+		summary.add(outcome)
+		reporter.add_outcome(cls, outcome)
+
+	summary.not_run += max(planned - reported, 0)
+
+	history.save()
+	if cls.config.incremental:
+		from . import incremental
+		incremental.save()
+
+	cls.is_done = True
+	reporter.end_suite(cls, summary)
+	return summary
+
+
+def _map_in_order(pool, call: callable, items: list, in_flight: int, limit: _failure_limit):
+	"""Like `pool.map`, but with at most `in_flight` calls queued at once, and no more once `limit` is reached.
+	"""
+	items = iter(items)
+	queued = deque()
+	while True:
+		while len(queued) < in_flight and not limit.reached:
+			item = next(items, _no_more)
+			if item is _no_more:
+				break
+			queued.append(pool.submit(call, item))
+
+		if not queued:
+			return
+		yield queued.popleft().result()
+
+
+def _run_test_suite(
+	cls: any,
+	threads: int = 0,
+	reporter = None,
+	order: str = None,
+	only: str = None,
+	names: set[str] = None,
+	limit: _failure_limit = None,
+) -> int:
+	threads = threads or cls.config.threads
+	tests, done = _plan_tests(cls, order, only, names)
+	limit = _failure_limit.for_suite(cls, limit)
+
+	# a suite with nothing left to run after filtering isn't shown at all
+	if (only or names is not None) and not tests:
+		return 0
+	run = lambda test: done[test.name] if test.name in done else _run_test(cls, test)
+
+	owns_reporter = reporter is None
+	reporter = reporter or _default_reporter()
+	reporter.start_suite(cls)
+
+	if cls.config.async_concurrency > 1 and not cls.config.trace_memory and not limit.reached:
+		# tests with memory limits are measured alone, like benchmarks
+		async_tests = [
+			t for t in tests
+			if t.is_async and not (t.benchmark or t.max_memory or t.max_retained) and t.name not in done
+		]
+		done.update(_run_async_tests(cls, async_tests, cls.config.async_concurrency, limit.remaining()))
+
+	# tracemalloc counts every thread's allocations together, so traced tests run one at a time
+	if threads > 1 and not cls.config.trace_memory and not limit.reached:
+		# outcomes come back in submission order, which keeps the output stable
+		with ThreadPoolExecutor(max_workers=threads) as pool:
+			summary = _report_results(cls, _map_in_order(pool, run, tests, threads, limit), reporter, limit, len(tests))
 	else:
-		print("├─ " + "\n├─ ".join(results[:-1]) + "\n╰─ " + results[-1])
-	print()
+		summary = _report_results(cls, (run(test) for test in tests), reporter, limit, len(tests))
 
+	if owns_reporter:
+		reporter.close()
 
+	return summary.fails
@@ -0,0 +1,268 @@
+from .soaper import TestSuite
+from .discovery import find_test_files, import_test_file
+from . import incremental
+
+
+from importlib import reload
+from os.path import abspath, dirname, isdir, isfile, join
+from types import ModuleType
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+import traceback
+
+
+# inotify event masks, from <sys/inotify.h>
+_IN_MODIFY = 0x2
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_ISDIR = 0x40000000
+_IN_CLOEXEC = 0o2000000
+_watch_mask = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+
+_event_header = struct.Struct("iIII")
+# how long to keep collecting changes after the first one, so a save that touches several files is one run
+_settle_time = 0.1
+
+
+def _walk_dirs(roots: list[str]):
+	for root in roots:
+		for path, dirs, _ in os.walk(root):
+			dirs[:] = [d for d in dirs if not d.startswith(".") and d != "__pycache__"]
+			yield path
+
+
+class _InotifyWatcher:
+	"""Waits for changes to python files using inotify.
+	"""
+
+	def __init__(self, roots: list[str]):
+		self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+		self.fd = self.libc.inotify_init1(_IN_CLOEXEC)
+		if self.fd < 0:
+			raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+		self.dirs = {}
+		for path in _walk_dirs(roots):
+			self._add_dir(path)
+
+	def _add_dir(self, path: str):
+		wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), _watch_mask)
+		if wd >= 0:
+			self.dirs[wd] = path
+
+	def _read_events(self, changed: set[str]):
+		data = os.read(self.fd, 1 << 16)
+		offset = 0
+
+		while offset < len(data):
+			wd, mask, _, length = _event_header.unpack_from(data, offset)
+			offset += _event_header.size
+			name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+			offset += length
+
+			path = join(self.dirs.get(wd, ""), name)
+			if mask & _IN_ISDIR:
+				if mask & (_IN_CREATE | _IN_MOVED_TO):
+					self._add_dir(path)
+			elif path.endswith(".py"):
+				changed.add(abspath(path))
+
+	def wait(self) -> set[str]:
+		changed = set()
+
+		while not changed:
+			select.select([self.fd], [], [])
+			self._read_events(changed)
+
+		deadline = time.monotonic() + _settle_time
+		while (remaining := deadline - time.monotonic()) > 0:
+			if select.select([self.fd], [], [], remaining)[0]:
+				self._read_events(changed)
+
+		return changed
+
+
+class _PollingWatcher:
+	"""Waits for changes to python files by checking their mtimes.
+	"""
+
+	def __init__(self, roots: list[str], interval: float = 0.5):
+		self.roots = roots
+		self.interval = interval
+		self.mtimes = self._scan()
+
+	def _scan(self) -> dict[str, int]:
+		mtimes = {}
+		for path in _walk_dirs(self.roots):
+			for name in os.listdir(path):
+				if name.endswith(".py"):
+					file_path = abspath(join(path, name))
+					try:
+						mtimes[file_path] = os.stat(file_path).st_mtime_ns
+					except OSError:
+						pass
+		return mtimes
+
+	def wait(self) -> set[str]:
+		while True:
+			time.sleep(self.interval)
+			mtimes = self._scan()
+			changed = {
+				path for path in mtimes.keys() | self.mtimes.keys()
+				if mtimes.get(path) != self.mtimes.get(path)
+			}
+			self.mtimes = mtimes
+			if changed:
+				return changed
+
+
+def _make_watcher(roots: list[str]):
+	if sys.platform.startswith("linux"):
+		try:
+			return _InotifyWatcher(roots)
+		except (OSError, AttributeError):
+			pass
+
+	return _PollingWatcher(roots)
+
+
+def _is_under(path: str, roots: list[str]) -> bool:
+	return any(path == root or path.startswith(root + os.sep) for root in roots)
+
+
+def _project_modules(roots: list[str]) -> dict[str, ModuleType]:
+	"""Get every loaded module whose file is inside the watched directories, by file path.
+	"""
+	modules = {}
+	for module in list(sys.modules.values()):
+		path = getattr(module, "__file__", None)
+		if path and _is_under(abspath(path), roots):
+			modules[abspath(path)] = module
+	return modules
+
+
+def _dependencies(module: ModuleType, by_name: dict[str, ModuleType]) -> set[str]:
+	"""Get the names of the project modules that `module` refers to through its globals.
+	"""
+	deps = set()
+	for value in list(vars(module).values()):
+		if isinstance(value, ModuleType):
+			name = value.__name__
+		else:
+			name = getattr(value, "__module__", None)
+
+		if isinstance(name, str) and name in by_name and name != module.__name__:
+			deps.add(name)
+	return deps
+
+
+def _reload_order(changed: set[str], modules: dict[str, ModuleType]) -> list[ModuleType]:
+	"""Get the changed modules and everything that depends on them, dependencies first.
+	"""
+	by_name = {module.__name__: module for module in modules.values()}
+	deps = {name: _dependencies(module, by_name) for name, module in by_name.items()}
+
+	affected = {modules[path].__name__ for path in changed if path in modules}
+	grew = True
+	while grew:
+		dependents = {name for name, uses in deps.items() if uses & affected}
+		grew = not dependents <= affected
+		affected |= dependents
+
+	order = []
+	visited = set()
+
+	def visit(name: str):
+		if name in visited:
+			return
+		visited.add(name)
+		for dep in sorted(deps[name] & affected):
+			visit(dep)
+		order.append(by_name[name])
+
+	for name in sorted(affected):
+		visit(name)
+
+	return order
+
+
+def _reload_module(module: ModuleType):
+	"""Reload a module, replacing its old suites with the ones it defines now.
+	"""
+	old_suites = [suite for suite in TestSuite.suites if suite.__module__ == module.__name__]
+	# the new suites go where the old ones were, so the order of the run stays the same
+	index = TestSuite.suites.index(old_suites[0]) if old_suites else len(TestSuite.suites)
+	for suite in old_suites:
+		TestSuite.remove(suite)
+
+	count = len(TestSuite.suites)
+	try:
+		reload(module)
+	finally:
+		TestSuite.suites[index:] = TestSuite.suites[count:] + TestSuite.suites[index:count]
+
+
+def _apply_changes(changed: set[str], paths: list[str], roots: list[str]) -> list[type]:
+	"""Reload what changed and import new test files, and return the suites that need to run again.
+	"""
+	# files are only fingerprinted once per run, so what changed has to be looked at again
+	incremental.clear_fingerprints()
+	modules = _project_modules(roots)
+	affected_modules = set()
+
+	for module in _reload_order(changed, modules):
+		path = abspath(module.__file__)
+		if not isfile(path):
+			# the file was deleted, so its suites are gone too
+			for suite in [s for s in TestSuite.suites if s.__module__ == module.__name__]:
+				TestSuite.remove(suite)
+			sys.modules.pop(module.__name__, None)
+			continue
+
+		try:
+			_reload_module(module)
+			affected_modules.add(module.__name__)
+		except Exception:
+			traceback.print_exc()
+
+	for path in find_test_files(paths):
+		if path in changed and path not in modules:
+			try:
+				affected_modules |= {suite.__module__ for suite in import_test_file(path)}
+			except Exception:
+				traceback.print_exc()
+
+	return [
+		suite for suite in TestSuite.suites
+		if suite.__module__ in affected_modules and not suite.is_done
+	]
+
+
+def watch(paths: list[str], run):
+	"""Run `run(suites)` with the suites affected by every change to the python files under `paths`.
+
+	Only the changed modules and the modules that depend on them are reloaded, everything else
+	stays imported between runs.
+	"""
+	roots = sorted({abspath(p if isdir(p) else dirname(p) or ".") for p in paths})
+	watcher = _make_watcher(roots)
+
+	print(f"watching {', '.join(roots)} for changes...")
+
+	try:
+		while True:
+			changed = watcher.wait()
+			suites = _apply_changes(changed, paths, roots)
+			if suites:
+				run(suites)
+			print("watching for changes...")
+	except KeyboardInterrupt:
+		pass
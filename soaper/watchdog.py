@@ -0,0 +1,209 @@
+from .context import context, _display_path
+
+
+from contextvars import copy_context
+from time import monotonic
+import faulthandler
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import threading
+import traceback
+
+
+# how long past its timeout a test gets before the whole process is dumped and stopped
+_grace_time = 5.0
+# how many of the innermost stack entries are shown for a test that timed out
+_max_stack_entries = 8
+
+_deadlines = {}
+_deadlines_lock = threading.Lock()
+
+
+def _update_fault_timer():
+	"""Arm faulthandler for the latest running deadline, or disarm it if nothing is running.
+
+	This only fires if a test hangs somewhere the watchdog can't get back control,
+	like C code that never releases the GIL, and ends the run with every thread's stack.
+	"""
+	if _deadlines:
+		remaining = max(_deadlines.values()) - monotonic()
+		faulthandler.dump_traceback_later(max(remaining, 0) + _grace_time, exit=True)
+	else:
+		faulthandler.cancel_dump_traceback_later()
+
+
+def _failed_result(test):
+	"""Get the result of a test that failed, which is a pass for a test marked as failing, like in `_finish_test`.
+	"""
+	from .soaper import TestResult
+	return TestResult.Pass if test.failing else TestResult.Fail
+
+
+def _timeout_outcome(cls: any, test, timeout: float, stack: list[tuple[str, int, str, str]]):
+	"""Make the outcome of a test that timed out, pointing at the line of the test it was stuck on.
+	"""
+	from .soaper import TestOutcome
+
+	is_test = [file_name == test.func.__code__.co_filename and func_name == test.func.__name__ for file_name, _, func_name, _ in stack]
+	line_num = stack[is_test.index(True)][1] if True in is_test else None
+
+	# everything outside of the test itself is soaper's own code
+	if True in is_test:
+		stack = stack[is_test.index(True):]
+
+	stack_lines = [
+		f"{_display_path(file_name)}:{line} in {func_name}" + (f"\n    {text}" if text else "")
+		for file_name, line, func_name, text in stack[-_max_stack_entries:]
+	]
+	msg = (
+		f"timed out after \x1b[22m{cls.color.received}{timeout:g}s\x1b[m\n\n"
+		+ "stuck at:\n"
+		+ "\n".join(stack_lines)
+	)
+
+	return TestOutcome(
+		cls.__name__, test.name, _failed_result(test), test.failing,
+		context.from_func(cls, test.func, line_num), msg, int(timeout * 1e9), timed_out=True,
+	)
+
+
+def run_in_thread(cls: any, test, timeout: float, run: callable):
+	"""Run `run(cls, test)` on its own thread, and give up on it after `timeout` seconds.
+
+	A test that times out is left running on its daemon thread, since threads can't be stopped,
+	and the run moves on to the next test.
+	"""
+	result = []
+	ctx = copy_context()
+
+	def target():
+		try:
+			result.append(ctx.run(run, cls, test))
+		finally:
+			from .soaper import _close_event_loop
+			_close_event_loop()
+
+	thread = threading.Thread(target=target, name=f"soaper-{test.name}", daemon=True)
+
+	with _deadlines_lock:
+		_deadlines[thread] = monotonic() + timeout
+		_update_fault_timer()
+
+	try:
+		thread.start()
+		thread.join(timeout)
+	finally:
+		with _deadlines_lock:
+			del _deadlines[thread]
+			_update_fault_timer()
+
+	if result:
+		return result[0]
+
+	from .soaper import _running_coroutines
+	coro = _running_coroutines.get(thread.ident)
+	if coro is not None:
+		# the thread itself is only waiting in the event loop
+		stack = _coroutine_stack(coro)
+	else:
+		frame = sys._current_frames().get(thread.ident)
+		stack = traceback.extract_stack(frame) if frame is not None else []
+
+	return _timeout_outcome(cls, test, timeout, [(s.filename, s.lineno, s.name, s.line) for s in stack])
+
+
+def timeout_outcome_for_coroutine(cls: any, test, timeout: float, coro):
+	"""Make the outcome of an async test that timed out while running alongside others.
+	"""
+	stack = _coroutine_stack(coro)
+	return _timeout_outcome(cls, test, timeout, [(s.filename, s.lineno, s.name, s.line) for s in stack])
+
+
+def _coroutine_stack(coro) -> traceback.StackSummary:
+	"""Follow a suspended coroutine through everything it's awaiting, outermost first.
+	"""
+	frames = []
+	while coro is not None and getattr(coro, "cr_frame", None) is not None:
+		frames.append((coro.cr_frame, coro.cr_frame.f_lineno))
+		coro = coro.cr_await
+
+	return traceback.StackSummary.extract(frames)
+
+
+# the lines faulthandler writes for each frame, like `File "test.py", line 12 in my_test`
+_fault_frame = re.compile(r'^\s*File "(.*)", line (\d+) in (.*)$')
+
+
+def _read_fault_stack(path: str) -> list[tuple[str, int, str, str]]:
+	"""Read the stack of the main thread of a faulthandler dump, outermost call first.
+	"""
+	with open(path, "r", encoding="utf-8", errors="replace") as f:
+		text = f.read()
+
+	stack = []
+	for line in text.splitlines():
+		# faulthandler writes the current thread first, then the rest
+		if stack and not line.startswith(" "):
+			break
+		match = _fault_frame.match(line)
+		if match:
+			file_name, line_num, func_name = match.groups()
+			stack.append((file_name, int(line_num), func_name, ""))
+
+	# faulthandler writes the innermost call first
+	stack.reverse()
+	return stack
+
+
+def _isolated_child(conn, cls: any, test, timeout: float, dump_path: str, run: callable):
+	with open(dump_path, "w") as dump:
+		faulthandler.dump_traceback_later(timeout, exit=True, file=dump)
+		outcome = run(cls, test)
+		faulthandler.cancel_dump_traceback_later()
+
+	conn.send(outcome)
+	conn.close()
+
+
+def run_isolated(cls: any, test, timeout: float, run: callable):
+	"""Run `run(cls, test)` in a forked process, and kill it after `timeout` seconds.
+
+	The child dumps its own stack with faulthandler when the time runs out, which is shown in the failure.
+	"""
+	method = "fork" if "fork" in multiprocessing.get_all_start_methods() else None
+	mp = multiprocessing.get_context(method)
+
+	fd, dump_path = tempfile.mkstemp(prefix="soaper-timeout-", suffix=".txt")
+	os.close(fd)
+
+	receiver, sender = mp.Pipe(duplex=False)
+	process = mp.Process(target=_isolated_child, args=(sender, cls, test, timeout, dump_path, run), daemon=True)
+
+	try:
+		process.start()
+		sender.close()
+
+		# the child stops itself on time, so the grace period only covers a child that can't
+		if receiver.poll(timeout + _grace_time):
+			try:
+				return receiver.recv()
+			except EOFError:
+				pass
+
+		if process.is_alive():
+			process.kill()
+		process.join()
+
+		stack = _read_fault_stack(dump_path)
+		if not stack and process.exitcode:
+			from .soaper import TestOutcome
+			msg = f"test process exited with code \x1b[22m{cls.color.received}{process.exitcode}"
+			return TestOutcome(cls.__name__, test.name, _failed_result(test), test.failing, context.from_func(cls, test.func), msg)
+
+		return _timeout_outcome(cls, test, timeout, stack)
+	finally:
+		receiver.close()
+		os.remove(dump_path)